@@ -0,0 +1,126 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Optional
+
+# Weight of the newest request in the running mean of slot hold times.
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(RuntimeError):
+    """Raised instead of queueing work that couldn't finish in time; answered with 503 + Retry-After."""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class DeadlineExceeded(Overloaded):
+    """Raised for work whose deadline passed while it waited; it never reaches the model."""
+
+
+def deadline_after(timeout_ms: Optional[float], default_ms: float) -> float:
+    """perf_counter() deadline for a request with an optional client timeout (ms)."""
+    return time.perf_counter() + (default_ms if timeout_ms is None else timeout_ms) / 1000.0
+
+
+# ----------------------------------------------------
+# Admission Control
+# ----------------------------------------------------
+class AdmissionController:
+    """At most ``max_concurrency`` requests analyzing at once, and at most ``max_queue`` waiting.
+
+    A request that would wait past its deadline, judged from the queue ahead
+    of it and the recent mean time a request holds a slot, is refused at once
+    rather than queued; so is one arriving at a full queue. Waiting requests
+    whose deadline passes give up their place. Released slots pass straight
+    to the oldest waiter, in arrival order.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, name: str = "inference"):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.name = name
+        self.active = 0
+        self.service_time = 0.0
+        self.admitted = 0
+        self.shed = 0
+        self.expired = 0
+        self._waiters = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self) -> float:
+        """Seconds a request arriving now would wait for a slot."""
+        if self.active < self.max_concurrency:
+            return 0.0
+        return (self.queued + 1) * self.service_time / self.max_concurrency
+
+    @asynccontextmanager
+    async def slot(self, deadline: float):
+        await self._acquire(deadline)
+        acquired = time.perf_counter()
+        try:
+            yield
+        finally:
+            held = time.perf_counter() - acquired
+            self.service_time += SERVICE_TIME_ALPHA * (held - self.service_time) if self.service_time else held
+            self._release()
+
+    async def _acquire(self, deadline: float):
+        remaining = deadline - time.perf_counter()
+        if remaining <= 0:
+            self.expired += 1
+            raise DeadlineExceeded("Request deadline passed before analysis started")
+        if self.active < self.max_concurrency and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            return
+
+        wait = self.estimated_wait()
+        if self.queued >= self.max_queue:
+            self.shed += 1
+            raise Overloaded("Server busy: too many requests waiting", retry_after=wait)
+        if wait > remaining:
+            self.shed += 1
+            raise Overloaded(f"Server busy: estimated wait {1000 * wait:.0f} ms exceeds the deadline", retry_after=wait)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, remaining)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                self._release()  # the slot arrived just as the request gave up on it
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.expired += 1
+                raise DeadlineExceeded("Request deadline passed while waiting for a free slot") from None
+            raise
+        self.admitted += 1
+
+    def _release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():  # skip waiters cancelled but not yet cleaned up
+                waiter.set_result(None)  # hand the slot over; active stays the same
+                return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "mean_service_ms": round(1000 * self.service_time, 3),
+            "estimated_wait_ms": round(1000 * self.estimated_wait(), 3),
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "expired": self.expired,
+        }
@@ -0,0 +1,246 @@
+import asyncio
+import time
+from typing import Callable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from admission import DeadlineExceeded
+
+
+# ----------------------------------------------------
+# Batch Statistics
+# ----------------------------------------------------
+class BatchStats:
+    """Running counters used to tune batch_max_size / batch_max_wait_ms."""
+
+    def __init__(self, max_batch_size: int):
+        self.max_batch_size = max_batch_size
+        self.batches = 0
+        self.requests = 0
+        self.flushed_full = 0
+        self.flushed_timeout = 0
+        self.failed_batches = 0
+        self.expired = 0
+        self.size_histogram = [0] * (max_batch_size + 1)
+        self.total_queue_wait = 0.0
+        self.total_run_time = 0.0
+
+    def record(self, size: int, reason: str, queue_wait: float, run_time: float):
+        self.batches += 1
+        self.requests += size
+        self.size_histogram[size] += 1
+        if reason == "full":
+            self.flushed_full += 1
+        else:
+            self.flushed_timeout += 1
+        self.total_queue_wait += queue_wait
+        self.total_run_time += run_time
+
+    def as_dict(self) -> dict:
+        batches = max(self.batches, 1)
+        requests = max(self.requests, 1)
+        mean_size = self.requests / batches
+        return {
+            "max_batch_size": self.max_batch_size,
+            "batches": self.batches,
+            "requests": self.requests,
+            "failed_batches": self.failed_batches,
+            "expired": self.expired,
+            "flushed_full": self.flushed_full,
+            "flushed_timeout": self.flushed_timeout,
+            "mean_batch_size": round(mean_size, 3),
+            "mean_occupancy": round(mean_size / self.max_batch_size, 3),
+            "mean_queue_wait_ms": round(1000 * self.total_queue_wait / requests, 3),
+            "mean_batch_run_ms": round(1000 * self.total_run_time / batches, 3),
+            "size_histogram": {str(size): count for size, count in enumerate(self.size_histogram) if count},
+        }
+
+
+# ----------------------------------------------------
+# Micro-Batcher
+# ----------------------------------------------------
+class MicroBatcher:
+    """Collect concurrent (1,C,H,W) tensors into one (N,C,H,W) batch per model call.
+
+    A batch is flushed as soon as it holds ``max_batch_size`` tensors, or when
+    ``max_wait_ms`` has passed since the first tensor of the batch was queued.
+    ``run_batch`` receives the stacked batch and must return an array whose
+    first axis matches it; row ``i`` is handed back to the ``i``-th caller.
+    Up to ``max_inflight_batches`` batches run on ``executor`` (a
+    BoundedExecutor, so its load accounting applies; None uses the loop's
+    default executor) at once, and
+    ``on_batch(size, run_seconds)`` is called after each successful batch.
+    ``buffers`` optionally supplies the preallocated (max_batch_size,C,H,W)
+    input buffers, e.g. shared-memory slots, that batches are stacked into.
+    Tensors may carry a perf_counter() deadline; ones still queued when it
+    passes fail with DeadlineExceeded instead of taking a row of a batch.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[np.ndarray], np.ndarray],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 5.0,
+        executor=None,
+        max_inflight_batches: int = 1,
+        on_batch: Optional[Callable[[int, float], None]] = None,
+        buffers: Optional[List[np.ndarray]] = None,
+    ):
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor
+        self.max_inflight_batches = max_inflight_batches
+        self.on_batch = on_batch
+        self.stats = BatchStats(max_batch_size)
+        self._pending: List[Tuple[np.ndarray, asyncio.Future, float, Optional[float]]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._full: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._batches: Set[asyncio.Task] = set()
+        # Preallocated (max_batch_size,C,H,W) input buffers, reused across batches.
+        self._buffers: List[np.ndarray] = list(buffers or [])
+
+    def add_buffers(self, buffers: List[np.ndarray]):
+        """Hand over preallocated input buffers that only exist after construction, e.g. shm slots."""
+        self._buffers.extend(buffers)
+
+    def _ensure_worker(self):
+        # Started lazily so the batcher binds to whichever loop serves requests.
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._full = asyncio.Event()
+            self._slots = asyncio.Semaphore(self.max_inflight_batches)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, tensor: np.ndarray, deadline: Optional[float] = None) -> np.ndarray:
+        """Queue one (1,C,H,W) tensor and wait for its row of the batched output."""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((tensor, future, time.perf_counter(), deadline))
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        self._wakeup.set()
+        return await future
+
+    async def submit_many(self, tensors: np.ndarray, deadline: Optional[float] = None) -> np.ndarray:
+        """Queue an (N,C,H,W) stack as N rows and wait for the (N, ...) outputs.
+
+        The rows are queued together, so they share session.run calls with
+        each other (and with concurrent requests) instead of one call per row.
+        """
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        queued_at = time.perf_counter()
+        futures = []
+        for row in range(tensors.shape[0]):
+            future = loop.create_future()
+            self._pending.append((tensors[row:row + 1], future, queued_at, deadline))
+            futures.append(future)
+        if len(self._pending) >= self.max_batch_size:
+            self._full.set()
+        self._wakeup.set()
+        return np.stack(await asyncio.gather(*futures))
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if not self._pending:
+                continue
+
+            # Keep filling while every inference slot is busy; time spent waiting
+            # for a slot counts against max_wait, which runs from the oldest tensor.
+            await self._slots.acquire()
+            reason = "full"
+            if len(self._pending) < self.max_batch_size:
+                remaining = max(0.0, self._pending[0][2] + self.max_wait - time.perf_counter())
+                try:
+                    await asyncio.wait_for(self._full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    reason = "timeout"
+            self._full.clear()
+
+            items = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            if self._pending:
+                self._wakeup.set()
+                if len(self._pending) >= self.max_batch_size:
+                    self._full.set()
+
+            task = asyncio.get_running_loop().create_task(self._dispatch(items, reason))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _dispatch(self, items, reason: str):
+        try:
+            await self._dispatch_batch(items, reason)
+        finally:
+            self._slots.release()
+
+    async def _dispatch_batch(self, items, reason: str):
+        # Requests whose client went away, or whose deadline passed while queued,
+        # are dropped before they cost inference time.
+        started = time.perf_counter()
+        live = []
+        for item in items:
+            future, deadline = item[1], item[3]
+            if future.done():
+                continue
+            if deadline is not None and deadline <= started:
+                self.stats.expired += 1
+                future.set_exception(DeadlineExceeded("Request deadline passed while queued for inference"))
+                continue
+            live.append(item)
+        items = live
+        if not items:
+            return
+
+        queue_wait = sum(started - queued_at for _, _, queued_at, _ in items)
+        buffer = self._take_buffer(items[0][0])
+        try:
+            batch = buffer[:len(items)]
+            np.concatenate([tensor for tensor, _, _, _ in items], axis=0, out=batch)
+            if self.executor is None:
+                outputs = await asyncio.get_running_loop().run_in_executor(None, self.run_batch, batch)
+            else:
+                outputs = await self.executor.run(self.run_batch, batch)
+        except Exception as exc:
+            self.stats.failed_batches += 1
+            for _, future, _, _ in items:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        finally:
+            self._buffers.append(buffer)
+
+        run_time = time.perf_counter() - started
+        self.stats.record(len(items), reason, queue_wait, run_time)
+        if self.on_batch is not None:
+            self.on_batch(len(items), run_time)
+        for row, (_, future, _, _) in enumerate(items):
+            if not future.done():
+                future.set_result(outputs[row])
+
+    def _take_buffer(self, sample: np.ndarray) -> np.ndarray:
+        shape = (self.max_batch_size,) + sample.shape[1:]
+        while self._buffers:
+            buffer = self._buffers.pop()
+            if buffer.shape == shape and buffer.dtype == sample.dtype:
+                return buffer
+        return np.empty(shape, dtype=sample.dtype)
+
+    async def close(self):
+        """Stop the worker task and fail any requests still waiting."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        for _, future, _, _ in self._pending:
+            if not future.done():
+                future.cancel()
+        self._pending.clear()
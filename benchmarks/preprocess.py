@@ -0,0 +1,101 @@
+"""Micro-benchmark for preprocess_image against the original implementation.
+
+Run from the repository root:
+
+    python -m benchmarks.preprocess [--repeat 20] [--tolerance 0.03]
+
+For each input it prints per-image time, peak bytes allocated during one
+call as the server makes it, output array included (numpy buffers only: tracemalloc does not see Pillow's own image
+memory), and the largest absolute difference from the original pipeline.
+It exits non-zero if any difference exceeds the tolerance.
+"""
+import argparse
+import io
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from preprocessing import preprocess_image
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def legacy_preprocess_image(image: Image.Image, size=(224, 224)):
+    """The pre-optimization pipeline, kept as the parity reference."""
+    image = image.convert("RGB").resize(size)
+    img_array = np.array(image).astype(np.float32) / 255.0
+    img_array = np.transpose(img_array, (2, 0, 1))
+    img_array = np.expand_dims(img_array, axis=0)
+    return img_array
+
+
+def synthetic_image(width: int, height: int, fmt: str) -> bytes:
+    """Gradient-plus-noise image encoded as ``fmt``; deterministic across runs."""
+    rng = np.random.default_rng(width * height)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    pixels = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)), (x + y) / 2], axis=2)
+    pixels = np.clip(pixels + 12 * rng.standard_normal(pixels.shape, dtype=np.float32), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, fmt, **({"quality": 90} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def sample_inputs():
+    inputs = {"cow.png": (ROOT / "cow.png").read_bytes()}
+    for width, height, label in [(320, 240, "small"), (1600, 1200, "medium"), (4000, 3000, "large")]:
+        for fmt in ("JPEG", "PNG"):
+            inputs[f"{label} {width}x{height} {fmt}"] = synthetic_image(width, height, fmt)
+    return inputs
+
+
+def time_per_image(fn, contents: bytes, repeat: int) -> float:
+    fn(Image.open(io.BytesIO(contents)))  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(Image.open(io.BytesIO(contents)))
+    return (time.perf_counter() - started) / repeat
+
+
+def peak_allocation(fn, contents: bytes) -> int:
+    image = Image.open(io.BytesIO(contents))
+    tracemalloc.start()
+    try:
+        fn(image)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--tolerance", type=float, default=0.03, help="max abs difference allowed per pixel")
+    args = parser.parse_args(argv)
+
+    print(f"{'input':<24}{'legacy ms':>11}{'new ms':>9}{'legacy KiB':>12}{'new KiB':>10}{'max diff':>10}")
+    failed = False
+    for name, contents in sample_inputs().items():
+        expected = legacy_preprocess_image(Image.open(io.BytesIO(contents)))
+        actual = preprocess_image(Image.open(io.BytesIO(contents)))
+        diff = float(np.abs(expected - actual).max())
+        failed |= diff > args.tolerance
+        print(
+            f"{name:<24}"
+            f"{1000 * time_per_image(legacy_preprocess_image, contents, args.repeat):>11.2f}"
+            f"{1000 * time_per_image(preprocess_image, contents, args.repeat):>9.2f}"
+            f"{peak_allocation(legacy_preprocess_image, contents) / 1024:>12.0f}"
+            f"{peak_allocation(preprocess_image, contents) / 1024:>10.0f}"
+            f"{diff:>10.4f}"
+        )
+    if failed:
+        print(f"FAIL: output differs from the legacy pipeline by more than {args.tolerance}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Offline latency / throughput benchmark for the model, preprocessing and the API.
+
+Run from the repository root on a CPU-only box (no network needed):
+
+    python -m benchmarks.suite --output bench.json
+    python -m benchmarks.suite --output bench.json --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+
+Levels:
+  model       raw session.run at several batch sizes
+  preprocess  preprocess_image on small / medium / very large synthetic images
+  api         POST /api/analyze-breed through an in-process ASGI client at
+              several concurrency levels (prediction cache disabled)
+
+Each case reports p50/p95/p99 latency, throughput and the process's peak
+RSS so far. With --baseline, a case regresses when its p95 latency grows or
+its throughput drops by more than --tolerance; the exit status is then 1.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from benchmarks.preprocess import ROOT, synthetic_image
+
+MODEL_BATCH_SIZES = (1, 2, 4, 8, 16)
+PREPROCESS_SIZES = {"small": (320, 240), "medium": (1600, 1200), "large": (4000, 3000)}
+API_CONCURRENCY = (1, 4, 16)
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # ru_maxrss is KiB on Linux
+
+
+def summarize(latencies, items: int, elapsed: float) -> dict:
+    latencies_ms = 1000 * np.asarray(latencies)
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "throughput_per_s": round(items / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+# ----------------------------------------------------
+# Levels
+# ----------------------------------------------------
+def bench_model(iterations: int) -> dict:
+    from executors import plan_threads
+    from session_factory import create_session
+    from settings import load_settings
+
+    settings = load_settings()
+    session = create_session(settings, plan_threads(settings).ort_intra_op_threads)
+    input_name = session.get_inputs()[0].name
+    rng = np.random.default_rng(0)
+
+    results = {}
+    for batch_size in MODEL_BATCH_SIZES:
+        batch = rng.random((batch_size, 3, 224, 224), dtype=np.float32)
+        for _ in range(3):
+            session.run(None, {input_name: batch})
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            call_started = time.perf_counter()
+            session.run(None, {input_name: batch})
+            latencies.append(time.perf_counter() - call_started)
+        results[f"model/batch={batch_size}"] = summarize(latencies, iterations * batch_size, time.perf_counter() - started)
+    return results
+
+
+def bench_preprocess(iterations: int) -> dict:
+    from preprocessing import preprocess_image
+
+    results = {}
+    for label, (width, height) in PREPROCESS_SIZES.items():
+        contents = synthetic_image(width, height, "JPEG")
+        preprocess_image(Image.open(io.BytesIO(contents)))
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            call_started = time.perf_counter()
+            preprocess_image(Image.open(io.BytesIO(contents)))
+            latencies.append(time.perf_counter() - call_started)
+        results[f"preprocess/{label}-{width}x{height}"] = summarize(latencies, iterations, time.perf_counter() - started)
+    return results
+
+
+def bench_api(requests_per_level: int) -> dict:
+    try:
+        import httpx
+    except ImportError:
+        print("httpx is not installed; skipping the api level", file=sys.stderr)
+        return {}
+
+    os.environ["CATTLE_CACHE_MAX_BYTES"] = "0"  # measure inference, not cache hits
+    import main
+
+    main.start_model()  # the ASGI client doesn't run the lifespan that normally does this
+    contents = (ROOT / "cow.png").read_bytes()
+
+    async def run_level(concurrency: int):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def one():
+                call_started = time.perf_counter()
+                response = await client.post("/api/analyze-breed", files={"image": ("cow.png", contents, "image/png")})
+                response.raise_for_status()
+                return time.perf_counter() - call_started
+
+            async def worker(count: int):
+                return [await one() for _ in range(count)]
+
+            await worker(2)  # warm-up
+            counts = [requests_per_level // concurrency + (i < requests_per_level % concurrency) for i in range(concurrency)]
+            started = time.perf_counter()
+            latencies = [latency for batch in await asyncio.gather(*map(worker, counts)) for latency in batch]
+            return summarize(latencies, len(latencies), time.perf_counter() - started)
+
+    return {f"api/concurrency={concurrency}": asyncio.run(run_level(concurrency)) for concurrency in API_CONCURRENCY}
+
+
+# ----------------------------------------------------
+# Baseline Comparison
+# ----------------------------------------------------
+def compare_to_baseline(results: dict, baseline: dict, tolerance: float) -> list:
+    regressions = []
+    for case, current in results.items():
+        previous = baseline.get(case)
+        if previous is None:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{case}: p95 {previous['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["throughput_per_s"] < previous["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{case}: throughput {previous['throughput_per_s']}/s -> {current['throughput_per_s']}/s")
+    return regressions
+
+
+def environment() -> dict:
+    import onnxruntime as ort
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "onnxruntime": ort.__version__,
+        "numpy": np.__version__,
+        "env": {name: value for name, value in sorted(os.environ.items()) if name.startswith("CATTLE_")},
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", default="model,preprocess,api", help="comma-separated subset to run")
+    parser.add_argument("--iterations", type=int, default=50, help="timed calls per model / preprocess case")
+    parser.add_argument("--requests", type=int, default=64, help="requests per api concurrency level")
+    parser.add_argument("--output", help="write results as JSON here")
+    parser.add_argument("--baseline", help="compare against this results JSON")
+    parser.add_argument("--save-baseline", help="write results as the new baseline here")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    levels = {"model": lambda: bench_model(args.iterations),
+              "preprocess": lambda: bench_preprocess(args.iterations),
+              "api": lambda: bench_api(args.requests)}
+    results = {}
+    for level in args.levels.split(","):
+        results.update(levels[level.strip()]())
+
+    print(f"{'case':<34}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'per s':>10}{'rss MB':>9}")
+    for case, row in results.items():
+        print(f"{case:<34}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+              f"{row['throughput_per_s']:>10.1f}{row['peak_rss_mb']:>9.1f}")
+
+    report = {"environment": environment(), "results": results}
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f)["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
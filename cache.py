@@ -0,0 +1,209 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# Perceptual hash: 16x16 grid of mean luminance over the 224x224 model input,
+# one bit per horizontally adjacent pair of cells (16 rows x 15 comparisons).
+_GRID = 16
+_HASH_BYTES = _GRID * (_GRID - 1) // 8
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+# Rough per-entry bookkeeping overhead on top of the stored prediction array.
+_ENTRY_OVERHEAD = 256
+
+
+def perceptual_hash(tensor: np.ndarray) -> np.ndarray:
+    """Difference hash of a (1,3,H,W) model input, packed into _HASH_BYTES bytes.
+
+    Hashing the preprocessed tensor (not the upload) means JPEG re-encodes and
+    resizes by messaging apps land within a few bits of the original. A
+    (1,H,W,3) uint8 pixel input hashes the same as its normalized tensor.
+    """
+    if tensor.dtype == np.uint8:
+        gray = tensor.reshape(tensor.shape[-3], tensor.shape[-2], 3).mean(axis=-1) / 255.0
+    else:
+        gray = tensor.reshape(3, tensor.shape[-2], tensor.shape[-1]).mean(axis=0)
+    height, width = gray.shape
+    cells = gray[:height - height % _GRID, :width - width % _GRID]
+    cells = cells.reshape(_GRID, cells.shape[0] // _GRID, _GRID, cells.shape[1] // _GRID).mean(axis=(1, 3))
+    return np.packbits(cells[:, 1:] > cells[:, :-1])
+
+
+def model_fingerprint(model_path: str):
+    """(size, mtime) of the model file, or None if it can't be stat'ed."""
+    try:
+        stat = os.stat(model_path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+# ----------------------------------------------------
+# Prediction Cache
+# ----------------------------------------------------
+class PredictionCache:
+    """Two-tier LRU/TTL cache of raw model outputs.
+
+    The exact tier is keyed by a BLAKE2b digest of the uploaded bytes. The
+    optional perceptual tier matches the preprocessed image by Hamming distance
+    of its perceptual hash, catching re-encoded copies of a cached photo.
+    Entries are dropped oldest-first once ``max_bytes`` is exceeded, expire
+    after ``ttl_seconds``, and are all discarded when the model file changes.
+    Each entry is tagged with the ``model_version`` live when its request
+    started; entries from any other version are neither stored nor served,
+    so a request that finishes on the old model after a hot swap can't
+    repopulate the cache with its predictions.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl_seconds: float,
+        model_path: str,
+        perceptual: bool = False,
+        max_hamming: int = 6,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.model_path = model_path
+        self.perceptual = perceptual
+        self.max_hamming = max_hamming
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (preds, expires_at, slot, version)
+        self._bytes = 0
+        self.model_version = ""
+        self._fingerprint = model_fingerprint(model_path)
+        # Perceptual hashes live in one preallocated matrix so a lookup is a single vectorized scan.
+        self._hashes = np.zeros((64, _HASH_BYTES), dtype=np.uint8)  # free slots have no key and are skipped
+        self._slot_keys = [None] * 64
+        self._free_slots = list(range(63, -1, -1))
+        self.hits_exact = 0
+        self.hits_perceptual = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key_for(contents: bytes, variant: str = "") -> str:
+        """Exact-tier key for ``contents`` as interpreted by ``variant`` (e.g. a raw upload's format and layout)."""
+        digest = hashlib.blake2b(variant.encode() + b"\0", digest_size=16)
+        digest.update(contents)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        """Exact-tier lookup. Does not count a miss, since the perceptual tier may still hit."""
+        self._check_model()
+        entry = self._live_entry(key)
+        if entry is None:
+            return None
+        self.hits_exact += 1
+        return entry[0]
+
+    def get_similar(self, tensor: np.ndarray) -> Optional[np.ndarray]:
+        """Perceptual-tier lookup for a preprocessed (1,3,H,W) tensor; counts a miss on failure."""
+        if not self.perceptual or not self._entries:
+            self.misses += 1
+            return None
+        query = perceptual_hash(tensor)
+        distances = _POPCOUNT[np.bitwise_xor(self._hashes, query)].sum(axis=1, dtype=np.int32)
+        for slot in np.argsort(distances):
+            if distances[slot] > self.max_hamming:
+                break
+            key = self._slot_keys[slot]
+            entry = self._live_entry(key) if key is not None else None
+            if entry is not None:
+                self.hits_perceptual += 1
+                return entry[0]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, preds: np.ndarray, tensor: Optional[np.ndarray] = None,
+            model_version: Optional[str] = None):
+        """Store ``preds``, unless they were computed for a ``model_version`` that is no longer live."""
+        if not self.enabled:
+            return
+        self._check_model()
+        if model_version is not None and model_version != self.model_version:
+            self.stale_puts += 1
+            return
+        self._remove(key)
+        preds = np.array(preds, copy=True)  # don't pin the whole batch output in memory
+        slot = None
+        if self.perceptual and tensor is not None:
+            slot = self._take_slot()
+            self._hashes[slot] = perceptual_hash(tensor)
+            self._slot_keys[slot] = key
+        self._entries[key] = (preds, time.monotonic() + self.ttl_seconds, slot, self.model_version)
+        self._bytes += preds.nbytes + _ENTRY_OVERHEAD
+        while self._bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def clear(self):
+        for key in list(self._entries):
+            self._remove(key)
+
+    def invalidate(self, model_version: Optional[str] = None):
+        """Discard every entry because the model behind them changed, optionally to ``model_version``."""
+        if model_version is not None:
+            self.model_version = model_version
+        self._fingerprint = model_fingerprint(self.model_path)
+        if self._entries:
+            self.invalidations += 1
+        self.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits_exact + self.hits_perceptual + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits_exact": self.hits_exact,
+            "hits_perceptual": self.hits_perceptual,
+            "misses": self.misses,
+            "hit_rate": round((self.hits_exact + self.hits_perceptual) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
+
+    def _live_entry(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] < time.monotonic() or entry[3] != self.model_version:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[0].nbytes + _ENTRY_OVERHEAD
+        slot = entry[2]
+        if slot is not None:
+            self._slot_keys[slot] = None
+            self._free_slots.append(slot)
+
+    def _take_slot(self) -> int:
+        if not self._free_slots:
+            capacity = len(self._slot_keys)
+            grown = np.zeros((capacity * 2, _HASH_BYTES), dtype=np.uint8)
+            grown[:capacity] = self._hashes
+            self._hashes = grown
+            self._slot_keys.extend([None] * capacity)
+            self._free_slots = list(range(capacity * 2 - 1, capacity - 1, -1))
+        return self._free_slots.pop()
+
+    def _check_model(self):
+        if model_fingerprint(self.model_path) != self._fingerprint:
+            self.invalidate()
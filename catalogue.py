@@ -0,0 +1,473 @@
+import hashlib
+import json
+import re
+from typing import Dict, Iterable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_breed_name(name: str) -> str:
+    """Lookup key for a breed name: case, spaces, hyphens and underscores are ignored.
+
+    "brown swiss", "Brown-Swiss" and "Brown_Swiss" all map to "brownswiss".
+    """
+    return _NON_ALNUM.sub("", name.lower())
+
+
+def build_breed_index(names: Iterable[str]) -> Dict[str, str]:
+    """Map each normalized name to its canonical BREED_INFO key."""
+    index = {}
+    for name in names:
+        key = normalize_breed_name(name)
+        if key in index:
+            raise ValueError(f"Breed names {index[key]!r} and {name!r} normalize to the same key")
+        index[key] = name
+    return index
+
+
+# ----------------------------------------------------
+# Breed Information
+# ----------------------------------------------------
+# Comprehensive breed information
+BREED_INFO = {
+    "Holstein": {
+        "type": "Dairy",
+        "description": "Large black and white spotted cattle, excellent milk producers.",
+        "origin": "Netherlands",
+        "average_weight": "Cows: 1,400-1,500 lbs, Bulls: 2,400-2,800 lbs",
+        "milk_production": "22,000-25,000 lbs per year",
+        "temperament": "Generally docile and easy to handle",
+        "primary_uses": "Primarily dairy, some crossbreeding for beef",
+        "care_requirements": "Requires high-quality feed and regular milking schedule"
+    },
+    "Alambadi": {
+        "type": "Draft/Draught",
+        "description": "Medium-sized draught cattle with grey coat and compact build.",
+        "origin": "Tamil Nadu, India",
+        "average_weight": "Cows: 700-800 lbs, Bulls: 1,100-1,300 lbs",
+        "milk_production": "1,500-2,000 lbs per year",
+        "temperament": "Hardy and docile, good working cattle",
+        "primary_uses": "Agricultural work, moderate milk production",
+        "care_requirements": "Adapted to hot climate, requires minimal care"
+    },
+    "Amritmahal": {
+        "type": "Dual Purpose",
+        "description": "Grey cattle with long horns, known for strength and endurance.",
+        "origin": "Karnataka, India",
+        "average_weight": "Cows: 800-900 lbs, Bulls: 1,200-1,400 lbs",
+        "milk_production": "2,200-3,000 lbs per year",
+        "temperament": "Active and strong, good for work",
+        "primary_uses": "Draft work, milk production, beef",
+        "care_requirements": "Heat tolerant, requires moderate nutrition"
+    },
+    "Ayrshire": {
+        "type": "Dairy",
+        "description": "Red and white spotted dairy cattle with excellent milk quality.",
+        "origin": "Scotland",
+        "average_weight": "Cows: 1,200-1,300 lbs, Bulls: 1,800-2,000 lbs",
+        "milk_production": "17,000-20,000 lbs per year",
+        "temperament": "Alert but gentle, easy to manage",
+        "primary_uses": "High-quality milk production",
+        "care_requirements": "Requires good pasture and regular milking"
+    },
+    "Banni": {
+        "type": "Draft",
+        "description": "Large grey buffalo breed known for exceptional strength.",
+        "origin": "Gujarat, India",
+        "average_weight": "Cows: 1,100-1,200 lbs, Bulls: 1,600-1,800 lbs",
+        "milk_production": "3,500-4,500 lbs per year",
+        "temperament": "Robust and powerful",
+        "primary_uses": "Heavy draft work, milk production",
+        "care_requirements": "Suited to dry regions, needs adequate water"
+    },
+    "Bargur": {
+        "type": "Dual Purpose",
+        "description": "Small to medium-sized cattle with grey to white coat.",
+        "origin": "Tamil Nadu, India",
+        "average_weight": "Cows: 600-700 lbs, Bulls: 900-1,000 lbs",
+        "milk_production": "1,800-2,200 lbs per year",
+        "temperament": "Hardy and adaptable",
+        "primary_uses": "Milk production, light draft work",
+        "care_requirements": "Well adapted to hilly terrain"
+    },
+    "Bhadawari": {
+        "type": "Dairy",
+        "description": "Buffalo breed with high butterfat content milk.",
+        "origin": "Uttar Pradesh, India",
+        "average_weight": "Cows: 900-1,000 lbs, Bulls: 1,200-1,400 lbs",
+        "milk_production": "4,000-5,000 lbs per year",
+        "temperament": "Calm and manageable",
+        "primary_uses": "High-fat milk production",
+        "care_requirements": "Requires good feeding and water access"
+    },
+    "Brown_Swiss": {
+        "type": "Dual Purpose",
+        "description": "Large brown cattle known for longevity and milk production.",
+        "origin": "Switzerland",
+        "average_weight": "Cows: 1,400-1,500 lbs, Bulls: 2,200-2,500 lbs",
+        "milk_production": "20,000-22,000 lbs per year",
+        "temperament": "Docile and long-lived",
+        "primary_uses": "Milk production, beef",
+        "care_requirements": "Requires quality feed and good management"
+    },
+    "Dangi": {
+        "type": "Draft",
+        "description": "Medium-sized draught cattle with greyish coat.",
+        "origin": "Maharashtra, India",
+        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,200 lbs",
+        "milk_production": "1,600-2,000 lbs per year",
+        "temperament": "Hardy and hardworking",
+        "primary_uses": "Agricultural operations, moderate milk",
+        "care_requirements": "Well adapted to harsh conditions"
+    },
+    "Deoni": {
+        "type": "Dual Purpose",
+        "description": "Medium-sized cattle with characteristic white markings.",
+        "origin": "Maharashtra/Karnataka, India",
+        "average_weight": "Cows: 800-900 lbs, Bulls: 1,100-1,300 lbs",
+        "milk_production": "2,500-3,200 lbs per year",
+        "temperament": "Docile and easy to handle",
+        "primary_uses": "Milk production, draft work",
+        "care_requirements": "Heat tolerant, moderate feed requirements"
+    },
+    "Gir": {
+        "type": "Dairy",
+        "description": "White to red cattle with distinctive curved horns and forehead.",
+        "origin": "Gujarat, India",
+        "average_weight": "Cows: 700-800 lbs, Bulls: 1,200-1,400 lbs",
+        "milk_production": "3,000-4,500 lbs per year",
+        "temperament": "Gentle and calm",
+        "primary_uses": "High-quality milk production",
+        "care_requirements": "Heat resistant, good grazing ability"
+    },
+    "Guernsey": {
+        "type": "Dairy",
+        "description": "Golden-colored dairy cattle producing rich, creamy milk.",
+        "origin": "Channel Islands",
+        "average_weight": "Cows: 1,100-1,200 lbs, Bulls: 1,700-1,900 lbs",
+        "milk_production": "14,000-16,000 lbs per year",
+        "temperament": "Docile and friendly",
+        "primary_uses": "High-quality milk with golden color",
+        "care_requirements": "Requires good pasture and care"
+    },
+    "Hallikar": {
+        "type": "Draft",
+        "description": "Medium-sized draught cattle with grey coat and strong build.",
+        "origin": "Karnataka, India",
+        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,200 lbs",
+        "milk_production": "1,800-2,200 lbs per year",
+        "temperament": "Strong and hardworking",
+        "primary_uses": "Agricultural work, moderate milk",
+        "care_requirements": "Hardy breed, minimal care needed"
+    },
+    "Hariana": {
+        "type": "Dual Purpose",
+        "description": "White to light grey cattle with good milk and draft qualities.",
+        "origin": "Haryana, India",
+        "average_weight": "Cows: 800-900 lbs, Bulls: 1,200-1,400 lbs",
+        "milk_production": "2,800-3,500 lbs per year",
+        "temperament": "Docile and manageable",
+        "primary_uses": "Milk production, draft work",
+        "care_requirements": "Heat tolerant, good foraging ability"
+    },
+    "Jaffrabadi": {
+        "type": "Dairy",
+        "description": "Large buffalo breed with high milk production capacity.",
+        "origin": "Gujarat, India",
+        "average_weight": "Cows: 1,200-1,400 lbs, Bulls: 1,800-2,200 lbs",
+        "milk_production": "5,500-7,000 lbs per year",
+        "temperament": "Calm but large and powerful",
+        "primary_uses": "High milk production",
+        "care_requirements": "Requires ample feed and water"
+    },
+    "Jersey": {
+        "type": "Dairy",
+        "description": "Small fawn-colored cattle producing rich, high-fat milk.",
+        "origin": "Jersey Island",
+        "average_weight": "Cows: 900-1,000 lbs, Bulls: 1,400-1,600 lbs",
+        "milk_production": "13,000-17,000 lbs per year",
+        "temperament": "Gentle and easy to handle",
+        "primary_uses": "High-butterfat milk production",
+        "care_requirements": "Requires quality feed, heat sensitive"
+    },
+    "Kangayam": {
+        "type": "Draft",
+        "description": "Red draught cattle known for their working ability.",
+        "origin": "Tamil Nadu, India",
+        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,200 lbs",
+        "milk_production": "1,500-2,000 lbs per year",
+        "temperament": "Strong and active",
+        "primary_uses": "Heavy agricultural work",
+        "care_requirements": "Heat tolerant, good working stamina"
+    },
+    "Kankrej": {
+        "type": "Dual Purpose",
+        "description": "Large silver-grey cattle with long horns and good milk yield.",
+        "origin": "Gujarat/Rajasthan, India",
+        "average_weight": "Cows: 800-950 lbs, Bulls: 1,300-1,500 lbs",
+        "milk_production": "3,200-4,000 lbs per year",
+        "temperament": "Hardy and robust",
+        "primary_uses": "Milk production, draft work",
+        "care_requirements": "Drought resistant, good grazing ability"
+    },
+    "Kasargod": {
+        "type": "Dual Purpose",
+        "description": "Small to medium cattle with reddish-brown coat.",
+        "origin": "Kerala, India",
+        "average_weight": "Cows: 600-700 lbs, Bulls: 850-950 lbs",
+        "milk_production": "2,000-2,500 lbs per year",
+        "temperament": "Docile and manageable",
+        "primary_uses": "Milk production, light work",
+        "care_requirements": "Adapted to coastal climate"
+    },
+    "Kenkatha": {
+        "type": "Dual Purpose",
+        "description": "Medium-sized cattle with grey to white coat coloration.",
+        "origin": "Madhya Pradesh, India",
+        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,250 lbs",
+        "milk_production": "2,200-2,800 lbs per year",
+        "temperament": "Hardy and adaptable",
+        "primary_uses": "Milk production, agricultural work",
+        "care_requirements": "Well suited to dry regions"
+    },
+    "Kherigarh": {
+        "type": "Draft",
+        "description": "Medium-sized draught cattle with good working capacity.",
+        "origin": "Uttar Pradesh, India",
+        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,150 lbs",
+        "milk_production": "1,800-2,200 lbs per year",
+        "temperament": "Strong and hardworking",
+        "primary_uses": "Agricultural operations",
+        "care_requirements": "Hardy breed, moderate care needed"
+    },
+    "Khillari": {
+        "type": "Draft",
+        "description": "Grey draught cattle known for their speed and agility.",
+        "origin": "Maharashtra/Karnataka, India",
+        "average_weight": "Cows: 650-750 lbs, Bulls: 950-1,100 lbs",
+        "milk_production": "1,500-2,000 lbs per year",
+        "temperament": "Active and fast-moving",
+        "primary_uses": "Fast agricultural work, cart pulling",
+        "care_requirements": "Heat tolerant, good foraging"
+    },
+    "Krishna_Valley": {
+        "type": "Dual Purpose",
+        "description": "Large cattle breed with good milk and draft capabilities.",
+        "origin": "Andhra Pradesh/Karnataka, India",
+        "average_weight": "Cows: 850-950 lbs, Bulls: 1,250-1,450 lbs",
+        "milk_production": "2,800-3,500 lbs per year",
+        "temperament": "Docile and strong",
+        "primary_uses": "Milk production, heavy work",
+        "care_requirements": "Requires good nutrition and care"
+    },
+    "Malnad_gidda": {
+        "type": "Dual Purpose",
+        "description": "Small hill cattle adapted to forest regions.",
+        "origin": "Karnataka, India",
+        "average_weight": "Cows: 550-650 lbs, Bulls: 750-850 lbs",
+        "milk_production": "1,800-2,200 lbs per year",
+        "temperament": "Hardy and sure-footed",
+        "primary_uses": "Hill farming, moderate milk",
+        "care_requirements": "Well adapted to hilly terrain"
+    },
+    "Mehsana": {
+        "type": "Dairy",
+        "description": "Buffalo breed with excellent milk production and quality.",
+        "origin": "Gujarat, India",
+        "average_weight": "Cows: 1,000-1,200 lbs, Bulls: 1,500-1,800 lbs",
+        "milk_production": "5,000-6,500 lbs per year",
+        "temperament": "Gentle and productive",
+        "primary_uses": "High milk production",
+        "care_requirements": "Requires good feeding and management"
+    },
+    "Murrah": {
+        "type": "Dairy",
+        "description": "Black buffalo breed, world's best dairy buffalo.",
+        "origin": "Haryana, India",
+        "average_weight": "Cows: 1,100-1,300 lbs, Bulls: 1,600-2,000 lbs",
+        "milk_production": "6,000-8,000 lbs per year",
+        "temperament": "Docile and highly productive",
+        "primary_uses": "Superior milk production",
+        "care_requirements": "Requires excellent feeding and care"
+    },
+    "Nagori": {
+        "type": "Dual Purpose",
+        "description": "White to light grey cattle with good drought resistance.",
+        "origin": "Rajasthan, India",
+        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,300 lbs",
+        "milk_production": "2,500-3,200 lbs per year",
+        "temperament": "Hardy and resilient",
+        "primary_uses": "Milk production, work in arid regions",
+        "care_requirements": "Excellent drought tolerance"
+    },
+    "Nagpuri": {
+        "type": "Draft",
+        "description": "Medium-sized working cattle with grey coat.",
+        "origin": "Maharashtra, India",
+        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,200 lbs",
+        "milk_production": "1,600-2,000 lbs per year",
+        "temperament": "Strong and dependable",
+        "primary_uses": "Agricultural work, moderate milk",
+        "care_requirements": "Hardy and low maintenance"
+    },
+    "Nili_Ravi": {
+        "type": "Dairy",
+        "description": "High-producing buffalo breed with distinctive blue eyes.",
+        "origin": "Punjab, Pakistan/India",
+        "average_weight": "Cows: 1,200-1,400 lbs, Bulls: 1,800-2,200 lbs",
+        "milk_production": "6,500-8,500 lbs per year",
+        "temperament": "Docile and highly productive",
+        "primary_uses": "Premium milk production",
+        "care_requirements": "Requires intensive management"
+    },
+    "Nimari": {
+        "type": "Dual Purpose",
+        "description": "Medium-sized cattle with good adaptability to harsh conditions.",
+        "origin": "Madhya Pradesh, India",
+        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,250 lbs",
+        "milk_production": "2,200-2,800 lbs per year",
+        "temperament": "Hardy and adaptable",
+        "primary_uses": "Milk production, draft work",
+        "care_requirements": "Well suited to semi-arid regions"
+    },
+    "Ongole": {
+        "type": "Dual Purpose",
+        "description": "Large white cattle with distinctive hump and long legs.",
+        "origin": "Andhra Pradesh, India",
+        "average_weight": "Cows: 900-1,000 lbs, Bulls: 1,400-1,600 lbs",
+        "milk_production": "2,800-3,500 lbs per year",
+        "temperament": "Docile but large and strong",
+        "primary_uses": "Milk production, draft work, beef",
+        "care_requirements": "Heat tolerant, good grazing ability"
+    },
+    "Pulikulam": {
+        "type": "Dual Purpose",
+        "description": "Small to medium cattle with reddish-brown coat and good heat tolerance.",
+        "origin": "Tamil Nadu, India",
+        "average_weight": "Cows: 650-750 lbs, Bulls: 900-1,050 lbs",
+        "milk_production": "2,000-2,500 lbs per year",
+        "temperament": "Hardy and manageable",
+        "primary_uses": "Milk production, light draft work",
+        "care_requirements": "Excellent heat tolerance"
+    },
+    "Rathi": {
+        "type": "Dual Purpose",
+        "description": "White cattle with brown patches, good milk and draft qualities.",
+        "origin": "Rajasthan, India",
+        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,300 lbs",
+        "milk_production": "2,800-3,500 lbs per year",
+        "temperament": "Docile and hardworking",
+        "primary_uses": "Milk production, agricultural work",
+        "care_requirements": "Drought resistant, hardy breed"
+    },
+    "Red_Dane": {
+        "type": "Dairy",
+        "description": "Red dairy cattle with good milk production and quality.",
+        "origin": "Denmark",
+        "average_weight": "Cows: 1,300-1,400 lbs, Bulls: 2,000-2,300 lbs",
+        "milk_production": "18,000-21,000 lbs per year",
+        "temperament": "Calm and productive",
+        "primary_uses": "High-quality milk production",
+        "care_requirements": "Requires good management and feeding"
+    },
+    "Red_Sindhi": {
+        "type": "Dual Purpose",
+        "description": "Red cattle known for heat tolerance and good milk production.",
+        "origin": "Sindh region (Pakistan/India)",
+        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,300 lbs",
+        "milk_production": "3,000-4,000 lbs per year",
+        "temperament": "Docile and heat tolerant",
+        "primary_uses": "Milk production in hot climates",
+        "care_requirements": "Excellent heat resistance"
+    },
+    "Sahiwal": {
+        "type": "Dairy",
+        "description": "Reddish-brown cattle, one of the best dairy breeds of India.",
+        "origin": "Punjab, Pakistan/India",
+        "average_weight": "Cows: 800-900 lbs, Bulls: 1,200-1,400 lbs",
+        "milk_production": "4,000-5,500 lbs per year",
+        "temperament": "Gentle and highly productive",
+        "primary_uses": "High milk production, heat tolerance",
+        "care_requirements": "Heat resistant, good feed conversion"
+    },
+    "Surti": {
+        "type": "Dairy",
+        "description": "Buffalo breed with good milk production and butterfat content.",
+        "origin": "Gujarat, India",
+        "average_weight": "Cows: 900-1,100 lbs, Bulls: 1,300-1,600 lbs",
+        "milk_production": "4,500-6,000 lbs per year",
+        "temperament": "Docile and manageable",
+        "primary_uses": "Quality milk production",
+        "care_requirements": "Requires adequate nutrition"
+    },
+    "Tharparkar": {
+        "type": "Dual Purpose",
+        "description": "White to light grey cattle adapted to arid conditions.",
+        "origin": "Rajasthan/Sindh",
+        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,300 lbs",
+        "milk_production": "2,500-3,200 lbs per year",
+        "temperament": "Hardy and drought resistant",
+        "primary_uses": "Milk production in desert regions",
+        "care_requirements": "Excellent drought tolerance"
+    },
+    "Toda": {
+        "type": "Dairy",
+        "description": "Small hill cattle with good milk quality, rare breed.",
+        "origin": "Tamil Nadu (Nilgiri Hills), India",
+        "average_weight": "Cows: 500-600 lbs, Bulls: 700-800 lbs",
+        "milk_production": "1,200-1,800 lbs per year",
+        "temperament": "Docile and hardy",
+        "primary_uses": "High-quality milk in hilly areas",
+        "care_requirements": "Adapted to cool hill climate"
+    },
+    "Umblachery": {
+        "type": "Draft",
+        "description": "Grey draught cattle suitable for wet land cultivation.",
+        "origin": "Tamil Nadu, India",
+        "average_weight": "Cows: 650-750 lbs, Bulls: 900-1,050 lbs",
+        "milk_production": "1,500-2,000 lbs per year",
+        "temperament": "Strong and suitable for paddy fields",
+        "primary_uses": "Wet land cultivation, moderate milk",
+        "care_requirements": "Well adapted to wet conditions"
+    },
+    "Vechur": {
+        "type": "Dairy",
+        "description": "World's smallest cattle breed with high-quality milk.",
+        "origin": "Kerala, India",
+        "average_weight": "Cows: 290-350 lbs, Bulls: 400-500 lbs",
+        "milk_production": "900-1,500 lbs per year",
+        "temperament": "Very gentle and manageable",
+        "primary_uses": "High-quality milk, ornamental",
+        "care_requirements": "Requires minimal space and feed"
+    }
+}
+
+
+# ----------------------------------------------------
+# Pre-Serialized Responses
+# ----------------------------------------------------
+class PreparedResponse:
+    """A JSON body encoded once, with a strong ETag and Cache-Control header."""
+
+    def __init__(self, content, max_age: int):
+        # Same encoding JSONResponse uses, so clients see identical bytes.
+        self.body = json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:32] + '"'
+        self.headers = {"ETag": self.etag, "Cache-Control": f"public, max-age={max_age}"}
+
+    def respond(self, request: Request) -> Response:
+        if self._matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=self.headers)
+        return Response(content=self.body, media_type="application/json", headers=self.headers)
+
+    def _matches(self, if_none_match) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses weak comparison, so W/"x" matches "x".
+        candidates = (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+        return self.etag in candidates
@@ -0,0 +1,280 @@
+"""Re-classify an archive of photos offline, e.g. after the model changes.
+
+Run from the repository root:
+
+    python classify_archive.py ./photos --output results.csv
+    python classify_archive.py --manifest photos.txt --output results.jsonl --top-k 3
+
+Photos are decoded and resized by a pool of worker processes and classified
+in batches in this process, with the server's session setup, label table and
+scoring. Results are appended to ``--output`` (CSV or JSONL, by extension)
+after every batch, so rerunning the same command after an interruption skips
+every path the file already holds. Start a new output file per model.
+"""
+import argparse
+import csv
+import dataclasses
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from catalogue import BREED_INFO
+from executors import plan_threads
+from postprocessing import default_labels_path, load_labels, softmax, top_k_classes
+from preprocessing import load_pixel_batch, normalize_pixel_batch
+from session_factory import batch_limit, create_session, run_in_chunks
+from settings import load_settings
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+FIELDS = ["path", "breed", "confidence", "type", "top_k", "error"]
+REPORT_EVERY_SECONDS = 5.0
+
+
+# ----------------------------------------------------
+# Inputs
+# ----------------------------------------------------
+def iter_directory(directory: str):
+    """Image files under ``directory``, in a stable order so reruns line up."""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in IMAGE_SUFFIXES:
+                yield os.path.join(root, name)
+
+
+def iter_manifest(path: str):
+    """Image paths listed one per line; relative ones are taken relative to the manifest."""
+    base = os.path.dirname(os.path.abspath(path))
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                yield os.path.join(base, line)
+
+
+# ----------------------------------------------------
+# Resumable Output
+# ----------------------------------------------------
+class ResultWriter:
+    """Appends result rows to a CSV or JSONL file, which doubles as the checkpoint.
+
+    On open, a line torn by a crash is cut off and the paths already written
+    are collected in ``done``. Every batch is flushed and fsynced, so at most
+    the batch in flight is lost.
+    """
+
+    def __init__(self, path: str, fmt: str):
+        self.fmt = fmt
+        self.done = set()
+        if os.path.exists(path):
+            self._drop_torn_line(path)
+            self.done = self._written_paths(path)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._csv = csv.DictWriter(self._file, FIELDS) if fmt == "csv" else None
+        if self._csv is not None and new_file:
+            self._csv.writeheader()
+
+    @staticmethod
+    def _drop_torn_line(path: str):
+        with open(path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _written_paths(self, path: str) -> set:
+        with open(path, newline="", encoding="utf-8") as f:
+            if self.fmt == "csv":
+                return {row["path"] for row in csv.DictReader(f)}
+            return {json.loads(line)["path"] for line in f if line.strip()}
+
+    def write(self, rows):
+        for row in rows:
+            if self._csv is not None:
+                top_k = row.get("top_k")
+                if top_k:
+                    row = {**row, "top_k": ";".join(f"{item['breed']}:{item['confidence']}" for item in top_k)}
+                self._csv.writerow(row)
+            else:
+                self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+
+# ----------------------------------------------------
+# Progress
+# ----------------------------------------------------
+class Progress:
+    """Images/sec and ETA on stderr every few seconds, plus where the time went."""
+
+    def __init__(self, total: int, skipped: int):
+        self.total = total
+        self.skipped = skipped
+        self.done = 0
+        self.failed = 0
+        self.decode_wait = 0.0
+        self.inference = 0.0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+
+    def add(self, done: int, failed: int):
+        self.done += done
+        self.failed += failed
+        now = time.perf_counter()
+        if now - self._last_report >= REPORT_EVERY_SECONDS:
+            self._last_report = now
+            self.report()
+
+    def report(self, final: bool = False):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        rate = self.done / elapsed
+        line = (f"{self.skipped + self.done}/{self.total} images ({self.failed} failed), "
+                f"{rate:.1f} images/s, inference {100 * self.inference / elapsed:.0f}% "
+                f"/ waiting on decode {100 * self.decode_wait / elapsed:.0f}% of {elapsed:.0f}s")
+        if not final and rate > 0:
+            line += f", ETA {(self.total - self.skipped - self.done) / rate:.0f}s"
+        print(line, file=sys.stderr, flush=True)
+
+
+# ----------------------------------------------------
+# Classification
+# ----------------------------------------------------
+def _ignore_interrupts():
+    # Ctrl+C is handled once, in the parent, which stops the pool.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class ArchiveClassifier:
+    """The server's model, labels and scoring, for (N,3,224,224) batches."""
+
+    def __init__(self, settings, intra_op_threads: int, top_k: int):
+        # Only class scores are needed offline.
+        settings = dataclasses.replace(settings, embedding_output=False)
+        self.session = create_session(settings, intra_op_threads)
+        self.input_name = self.session.get_inputs()[0].name
+        # A CATTLE_MODEL_INPUT=uint8 graph takes the workers' pixels as they are.
+        self.takes_pixels = self.session.get_inputs()[0].type == "tensor(uint8)"
+        output = self.session.get_outputs()[0]
+        self.output_name = output.name
+        self.batch_limit = batch_limit(self.session)
+        self.labels = load_labels(
+            settings.labels_path or default_labels_path(settings.model_path),
+            output.shape[-1] if isinstance(output.shape[-1], int) else None,
+        )
+        self.temperature = settings.score_temperature
+        self.top_k = top_k
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run([self.output_name], {self.input_name: batch})[0]
+
+    def classify(self, paths, batch: np.ndarray):
+        scores = softmax(run_in_chunks(self._run, batch, self.batch_limit), self.temperature)
+        indices, confidences = top_k_classes(scores, self.top_k)
+        rows = []
+        for path, row_indices, row_confidences in zip(paths, indices, confidences):
+            breed = self.labels[row_indices[0]]
+            row = {
+                "path": path,
+                "breed": breed,
+                "confidence": round(float(row_confidences[0]), 4),
+                "type": BREED_INFO.get(breed, {}).get("type", ""),
+            }
+            if self.top_k > 1:
+                row["top_k"] = [
+                    {"breed": self.labels[index], "confidence": round(float(confidence), 4)}
+                    for index, confidence in zip(row_indices, row_confidences)
+                ]
+            rows.append(row)
+        return rows
+
+
+def classify_archive(paths, writer: ResultWriter, classifier: ArchiveClassifier, batch_size: int,
+                     workers: int, progress: Progress):
+    """Decode ``paths`` in ``workers`` processes and classify them batch by batch, in order.
+
+    At most two chunks per worker are decoded ahead, which keeps memory flat
+    however large the archive and however far decode outruns inference.
+    """
+    buffer = np.empty((batch_size, 3, 224, 224), dtype=np.float32)
+    chunks = (paths[start:start + batch_size] for start in range(0, len(paths), batch_size))
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"), initializer=_ignore_interrupts,
+    )
+    pending = deque()
+
+    def finish_oldest():
+        started = time.perf_counter()
+        pixels, loaded, errors = pending.popleft().result()
+        decoded = time.perf_counter()
+        rows = []
+        if loaded:
+            batch = pixels if classifier.takes_pixels else normalize_pixel_batch(pixels, out=buffer[:len(loaded)])
+            rows = classifier.classify(loaded, batch)
+        progress.decode_wait += decoded - started
+        progress.inference += time.perf_counter() - decoded
+        rows.extend({"path": path, "error": message} for path, message in errors.items())
+        writer.write(rows)
+        progress.add(len(rows), len(errors))
+
+    try:
+        for chunk in chunks:
+            pending.append(pool.submit(load_pixel_batch, chunk))
+            if len(pending) > 2 * workers:
+                finish_oldest()
+        while pending:
+            finish_oldest()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def main(argv=None) -> int:
+    settings = load_settings()
+    plan = plan_threads(dataclasses.replace(settings, inference_workers=1))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("directory", nargs="?", help="directory to classify recursively")
+    source.add_argument("--manifest", help="file listing one image path per line")
+    parser.add_argument("--output", required=True, help="results file; .csv or .jsonl")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None, help="default: from --output's extension")
+    parser.add_argument("--top-k", type=int, default=1, help="also list the k best breeds per image")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=plan.decode_workers,
+                        help=f"decode processes (default: {plan.decode_workers})")
+    parser.add_argument("--threads", type=int, default=plan.ort_intra_op_threads,
+                        help=f"ORT intra-op threads (default: {plan.ort_intra_op_threads})")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("jsonl" if args.output.lower().endswith((".jsonl", ".json")) else "csv")
+    paths = list(iter_manifest(args.manifest) if args.manifest else iter_directory(args.directory))
+    writer = ResultWriter(args.output, fmt)
+    todo = [path for path in paths if path not in writer.done]
+    progress = Progress(total=len(paths), skipped=len(paths) - len(todo))
+    if progress.skipped:
+        print(f"Resuming: {progress.skipped} of {len(paths)} images already in {args.output}", file=sys.stderr)
+
+    try:
+        classifier = ArchiveClassifier(settings, max(1, args.threads), max(1, args.top_k))
+        classify_archive(todo, writer, classifier, max(1, args.batch_size), max(1, args.workers), progress)
+    except KeyboardInterrupt:
+        progress.report(final=True)
+        print(f"Interrupted; rerun the same command to resume from {args.output}", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+    progress.report(final=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool already has its maximum number of queued jobs."""
+
+
+# ----------------------------------------------------
+# Core Budget
+# ----------------------------------------------------
+@dataclass(frozen=True)
+class ThreadPlan:
+    decode_workers: int
+    inference_workers: int
+    ort_intra_op_threads: int
+
+
+def plan_threads(settings, cpu_count: int = None) -> ThreadPlan:
+    """Split the machine's cores between decode workers and ORT's intra-op threads.
+
+    Each concurrent session.run uses ``ort_intra_op_threads`` cores, so unless
+    overridden, inference gets half the cores and decode gets the rest. The
+    total never exceeds the core count unless the settings pin larger values.
+    """
+    cores = cpu_count or os.cpu_count() or 1
+    inference_workers = max(1, settings.inference_workers)
+    intra = settings.ort_intra_op_threads or max(1, (cores // 2) // inference_workers)
+    decode = settings.decode_workers or max(1, cores - inference_workers * intra)
+    return ThreadPlan(decode_workers=decode, inference_workers=inference_workers, ort_intra_op_threads=intra)
+
+
+# ----------------------------------------------------
+# Bounded Executor
+# ----------------------------------------------------
+class BoundedExecutor:
+    """Thread or process pool that refuses work once ``max_queue`` jobs are waiting.
+
+    ``run`` awaits the job without blocking the event loop, so the loop keeps
+    accepting connections while the pool works.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int, name: str):
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.name = name
+        self.pool = self._make_pool(kind, workers, name)
+        self.inflight = 0
+        self.rejected = 0
+
+    @staticmethod
+    def _make_pool(kind: str, workers: int, name: str) -> Executor:
+        if kind == "process":
+            # Spawned workers only import the module of the submitted function,
+            # never the model, and don't inherit ORT's thread pools.
+            return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        if kind == "thread":
+            return ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        raise ValueError(f"Unknown executor kind: {kind!r} (expected 'thread' or 'process')")
+
+    async def run(self, fn, *args):
+        if self.inflight >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorSaturated(f"{self.name} pool is saturated")
+        self.inflight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+        finally:
+            self.inflight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "inflight": self.inflight,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
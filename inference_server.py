@@ -0,0 +1,312 @@
+"""Shared-memory inference server for multi-worker deployments.
+
+Start it once per node, then point the HTTP workers at it:
+
+    python inference_server.py                       # CATTLE_INFERENCE_PROCESSES processes
+    CATTLE_INFERENCE_BACKEND=shm uvicorn main:app --workers 8
+
+Only the inference processes load the model and own ORT thread pools, so model
+memory and core usage are fixed by CATTLE_INFERENCE_PROCESSES no matter how
+many HTTP workers run.
+
+Each HTTP worker creates one shared-memory segment split into a ring of
+CATTLE_SHM_SLOTS slots. Every slot holds an input area of batch_max_size
+images in the model's input format ((3,224,224) float32, or (224,224,3) uint8
+with CATTLE_MODEL_INPUT=uint8) and output areas for the matching logits (and
+embeddings, when the model exposes them), and has
+its own Unix-socket connection to the server. The micro-batcher stacks
+requests directly into a slot's input area. A 4-byte "run N rows" message
+wakes the inference process that owns the connection. That process binds the
+shared input and output areas to the session with IOBinding, so tensors are
+never pickled or copied between processes.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import selectors
+import signal
+import socket
+import struct
+import sys
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from session_factory import EMBEDDING_OUTPUT
+
+logger = logging.getLogger(__name__)
+
+_REQUEST = struct.Struct("<I")  # rows to run
+_REPLY = struct.Struct("<iI")  # status (0 = ok), length of the error message that follows
+_ALIGN = 64
+
+
+def _recv_exactly(conn: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("inference server connection closed")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def _recv_line(conn: socket.socket) -> dict:
+    data = bytearray()
+    while not data.endswith(b"\n"):
+        chunk = conn.recv(1)
+        if not chunk:
+            raise ConnectionError("inference server connection closed")
+        data.extend(chunk)
+    return json.loads(data)
+
+
+def _send_line(conn: socket.socket, message: dict):
+    conn.sendall(json.dumps(message).encode() + b"\n")
+
+
+def slot_layout(max_batch: int, input_shape, output_dim: int, embedding_dim: int = 0, input_dtype: str = "float32"):
+    """Byte sizes of one slot's input area, output areas (logits then embeddings) and total (64-byte aligned)."""
+    input_bytes = max_batch * int(np.prod(input_shape)) * np.dtype(input_dtype).itemsize
+    output_bytes = max_batch * (output_dim + embedding_dim) * 4
+    input_padded = -(-input_bytes // _ALIGN) * _ALIGN
+    slot_bytes = -(-(input_padded + output_bytes) // _ALIGN) * _ALIGN
+    return input_padded, output_bytes, slot_bytes
+
+
+def _slot_views(buffer, index: int, max_batch: int, input_shape, output_dim: int, embedding_dim: int = 0,
+                input_dtype: str = "float32"):
+    input_padded, _, slot_bytes = slot_layout(max_batch, input_shape, output_dim, embedding_dim, input_dtype)
+    offset = index * slot_bytes
+    inputs = np.ndarray((max_batch, *input_shape), dtype=input_dtype, buffer=buffer, offset=offset)
+    outputs_offset = offset + input_padded
+    outputs = np.ndarray((max_batch, output_dim), dtype=np.float32, buffer=buffer, offset=outputs_offset)
+    embeddings = np.ndarray((max_batch, embedding_dim), dtype=np.float32, buffer=buffer,
+                            offset=outputs_offset + outputs.nbytes)
+    return inputs, outputs, embeddings
+
+
+# ----------------------------------------------------
+# Server (inference processes)
+# ----------------------------------------------------
+class _Connection:
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        self.shm = None
+        self.inputs = None
+        self.outputs = None
+        self.embeddings = None
+
+
+def _serve(listener: socket.socket, settings, intra_op_threads: int):
+    from session_factory import create_session
+
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent coordinates shutdown
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    session = create_session(settings, intra_op_threads)
+    input_name = session.get_inputs()[0].name
+    output_name = session.get_outputs()[0].name
+    input_shape = [int(dim) for dim in session.get_inputs()[0].shape[1:]]
+    # "tensor(uint8)" for a CATTLE_MODEL_INPUT=uint8 graph, else "tensor(float)".
+    input_dtype = "uint8" if session.get_inputs()[0].type == "tensor(uint8)" else "float32"
+    output_dim = int(session.get_outputs()[0].shape[1])
+    embedding = next((output for output in session.get_outputs() if output.name == EMBEDDING_OUTPUT), None)
+    embedding_dim = int(embedding.shape[1]) if embedding is not None else 0
+    hello = {"input_shape": input_shape, "input_dtype": input_dtype, "output_dim": output_dim,
+             "embedding_dim": embedding_dim}
+
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    logger.info("Inference process %d ready", os.getpid())
+
+    while True:
+        for key, _ in selector.select():
+            if key.fileobj is listener:
+                try:
+                    conn, _ = listener.accept()
+                except BlockingIOError:
+                    continue  # another inference process won the accept
+                conn.setblocking(True)
+                _send_line(conn, hello)
+                selector.register(conn, selectors.EVENT_READ, _Connection(conn))
+                continue
+
+            state: _Connection = key.data
+            try:
+                if state.shm is None:
+                    _register(state, _recv_line(state.conn), input_shape, output_dim, embedding_dim, input_dtype)
+                    continue
+                (rows,) = _REQUEST.unpack(_recv_exactly(state.conn, _REQUEST.size))
+                _run(session, input_name, output_name, state, rows, input_shape)
+            except ConnectionError:
+                selector.unregister(state.conn)
+                state.conn.close()
+                if state.shm is not None:
+                    state.inputs = state.outputs = state.embeddings = None
+                    state.shm.close()
+
+
+def _register(state: _Connection, message: dict, input_shape, output_dim: int, embedding_dim: int,
+              input_dtype: str):
+    shm = shared_memory.SharedMemory(name=message["shm"])
+    # The HTTP worker owns the segment; don't let this process's tracker unlink it.
+    resource_tracker.unregister(shm._name, "shared_memory")
+    state.shm = shm
+    state.inputs, state.outputs, state.embeddings = _slot_views(
+        shm.buf, message["slot"], message["max_batch"], input_shape, output_dim, embedding_dim, input_dtype)
+    _send_line(state.conn, {"ok": True})
+
+
+def _run(session, input_name: str, output_name: str, state: _Connection, rows: int, input_shape):
+    try:
+        if not 0 < rows <= len(state.inputs):
+            raise ValueError(f"batch of {rows} rows does not fit the slot")
+        binding = session.io_binding()
+        binding.bind_input(input_name, "cpu", 0, state.inputs.dtype, [rows, *input_shape], state.inputs.ctypes.data)
+        binding.bind_output(output_name, "cpu", 0, np.float32, [rows, state.outputs.shape[1]],
+                            state.outputs.ctypes.data)
+        if state.embeddings.shape[1]:
+            binding.bind_output(EMBEDDING_OUTPUT, "cpu", 0, np.float32, [rows, state.embeddings.shape[1]],
+                                state.embeddings.ctypes.data)
+        session.run_with_iobinding(binding)
+    except Exception as e:
+        message = f"{type(e).__name__}: {e}".encode()
+        state.conn.sendall(_REPLY.pack(1, len(message)) + message)
+        return
+    state.conn.sendall(_REPLY.pack(0, 0))
+
+
+def serve_forever(settings, processes: int):
+    """Bind the socket, fork ``processes`` inference processes and wait for them."""
+    cores = os.cpu_count() or 1
+    intra_op_threads = settings.ort_intra_op_threads or max(1, cores // processes)
+
+    if os.path.exists(settings.shm_socket_path):
+        os.unlink(settings.shm_socket_path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(settings.shm_socket_path)
+    listener.listen(128)
+    listener.setblocking(False)
+
+    # Turn SIGTERM into a clean exit so the finally block stops the children.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # Fork before any session exists, so children share nothing but the socket.
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_serve, args=(listener, settings, intra_op_threads), daemon=True)
+               for _ in range(processes)]
+    for worker in workers:
+        worker.start()
+    logger.info("Serving %d inference processes x %d threads on %s", processes, intra_op_threads,
+                settings.shm_socket_path)
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for worker in workers:
+            worker.terminate()
+        os.unlink(settings.shm_socket_path)
+
+
+# ----------------------------------------------------
+# Client (HTTP workers)
+# ----------------------------------------------------
+class ShmInferenceClient:
+    """run_batch() replacement that ships batches to the inference server through shared memory.
+
+    ``buffers`` are the slot input areas; hand them to the MicroBatcher so it
+    stacks requests in place. Batches from any other buffer are copied into a
+    free slot first.
+    """
+
+    def __init__(self, socket_path: str, slots: int, max_batch: int):
+        self.max_batch = max_batch
+        self._connections = []
+        for _ in range(slots):
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                conn.connect(socket_path)
+            except OSError as e:
+                raise ConnectionError(f"No inference server on {socket_path}; start `python inference_server.py`") from e
+            self._connections.append(conn)
+
+        hello = _recv_line(self._connections[0])
+        self.input_shape = tuple(hello["input_shape"])
+        self.input_dtype = hello.get("input_dtype", "float32")
+        self.output_dim = hello["output_dim"]
+        self.embedding_dim = hello.get("embedding_dim", 0)
+        for conn in self._connections[1:]:
+            _recv_line(conn)
+
+        _, _, slot_bytes = slot_layout(max_batch, self.input_shape, self.output_dim, self.embedding_dim,
+                                       self.input_dtype)
+        self._shm = shared_memory.SharedMemory(create=True, size=slot_bytes * slots)
+        self._views = [
+            _slot_views(self._shm.buf, index, max_batch, self.input_shape, self.output_dim, self.embedding_dim,
+                        self.input_dtype)
+            for index in range(slots)
+        ]
+        self._slot_by_address = {inputs.ctypes.data: index for index, (inputs, _, _) in enumerate(self._views)}
+        self._free = queue.Queue()
+        for index, conn in enumerate(self._connections):
+            _send_line(conn, {"shm": self._shm.name, "slot": index, "max_batch": max_batch})
+            _recv_line(conn)
+            self._free.put(index)
+
+    @property
+    def buffers(self):
+        return [inputs for inputs, _, _ in self._views]
+
+    def run_batch(self, batch: np.ndarray) -> np.ndarray:
+        index = self._slot_by_address.get(batch.ctypes.data)
+        if index is None:
+            index = self._free.get()
+            try:
+                return self._run_slot(index, batch, copy_in=True)
+            finally:
+                self._free.put(index)
+        # The batcher owns this slot's buffer until run_batch returns.
+        return self._run_slot(index, batch, copy_in=False)
+
+    def _run_slot(self, index: int, batch: np.ndarray, copy_in: bool) -> np.ndarray:
+        inputs, outputs, embeddings = self._views[index]
+        rows = batch.shape[0]
+        if copy_in:
+            np.copyto(inputs[:rows], batch)
+        conn = self._connections[index]
+        conn.sendall(_REQUEST.pack(rows))
+        status, length = _REPLY.unpack(_recv_exactly(conn, _REPLY.size))
+        if status:
+            raise RuntimeError(_recv_exactly(conn, length).decode())
+        # Outputs are small; copy them out (logits then embedding per row, like the
+        # local backend) so the slot can be reused immediately.
+        return np.concatenate([outputs[:rows], embeddings[:rows]], axis=1)
+
+    def close(self):
+        for conn in self._connections:
+            conn.close()
+        self._views = []
+        self._shm.close()
+        self._shm.unlink()
+
+
+def main(argv=None) -> int:
+    import argparse
+
+    from settings import load_settings
+
+    settings = load_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=settings.inference_processes or max(1, (os.cpu_count() or 2) // 2))
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(process)d %(levelname)s %(message)s")
+    serve_forever(settings, args.processes)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class NotReady(RuntimeError):
+    """Raised for work that needs the model before startup has finished loading it."""
+
+
+# ----------------------------------------------------
+# Startup Phases and Readiness
+# ----------------------------------------------------
+class Startup:
+    """Timed startup phases plus the readiness state behind /readyz.
+
+    Phases run in a background thread while the server is already accepting
+    connections; ``ready`` flips once the model is loaded and warmed up.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.ready = False
+        self.error: Optional[str] = None
+        self.ready_after: Optional[float] = None
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - started
+            logger.info("Startup phase %s took %.1f ms", name, 1000 * self.phases[name])
+
+    def mark_ready(self):
+        self.ready_after = time.perf_counter() - self.started
+        self.ready = True
+        logger.info("Ready to serve after %.1f ms", 1000 * self.ready_after)
+
+    def fail(self, exc: BaseException):
+        self.error = f"{type(exc).__name__}: {exc}"
+        logger.error("Startup failed: %s", self.error, exc_info=exc)
+
+    def as_dict(self) -> dict:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "ready_after_ms": None if self.ready_after is None else round(1000 * self.ready_after, 1),
+            "phases_ms": {name: round(1000 * seconds, 1) for name, seconds in self.phases.items()},
+        }
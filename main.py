@@ -1,16 +1,89 @@
-from fastapi import FastAPI, File, UploadFile
+import asyncio
+import hmac
+import json
+import logging
+import time
+import zipfile
+import zlib
+from collections import deque
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import List, Optional, Tuple, Union
+
+from fastapi import Depends, FastAPI, File, Header, Query, Request, UploadFile, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-import onnxruntime as ort
+from fastapi.responses import JSONResponse, PlainTextResponse
 import numpy as np
-from PIL import Image
-import io
-import random
+
+from admission import AdmissionController, Overloaded, deadline_after
+from batching import MicroBatcher
+from cache import PredictionCache
+from catalogue import BREED_INFO, PreparedResponse, build_breed_index, normalize_breed_name
+from executors import BoundedExecutor, ExecutorSaturated, plan_threads
+from lifecycle import NotReady, Startup
+from metrics import (
+    BATCH_SECONDS, BATCH_SIZE, ERRORS, IMAGE_BYTES, IMAGE_MEGAPIXELS, REGISTRY, STREAM_FRAMES, STREAMS_OPEN,
+    Counter, Gauge, MetricsMiddleware, StageTimer,
+)
+from model_swap import ModelSwapper, ModelVersion, model_digest, watch_model_file
+from postprocessing import default_labels_path, load_labels, softmax, top_k_classes
+from preprocessing import (
+    TTA_VIEWS, ImageRejected, decode_and_preprocess_timed, decode_and_preprocess_views_timed, decode_and_tile_timed,
+    load_pixel_upload, preprocess_image, sniff_image,
+)
+from session_factory import batch_limit, resolve_model_path, run_in_chunks
+from settings import load_settings
+from similarity import open_index
+from streaming import FrameSlot, PredictionSmoother
+from uploads import BodySizeLimitMiddleware, MultipartStream, UploadStreamingResponse, UploadTooLarge, read_upload
+
+logger = logging.getLogger(__name__)
 
 # ----------------------------------------------------
 # FastAPI Setup
 # ----------------------------------------------------
-app = FastAPI()
+async def _start_in_background():
+    try:
+        await asyncio.to_thread(start_model)
+    except Exception as e:
+        startup.fail(e)
+
+
+async def _watch_model_file(loading: asyncio.Task):
+    # Hot reload is for the local backend; inference_server.py owns the shm backend's model.
+    await asyncio.shield(loading)
+    if startup.ready and settings.model_watch_interval_s > 0 and settings.inference_backend == "local":
+        if settings.model_shadow_fraction > 0 and not settings.admin_token:
+            logger.warning(
+                "CATTLE_MODEL_SHADOW_FRACTION is set but the admin API is disabled (no CATTLE_ADMIN_TOKEN), "
+                "so a shadowed model could never be promoted; file-watch reloads go live once warm"
+            )
+        await watch_model_file(onnx_model_path, settings.model_watch_interval_s, _reload_changed_model)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Let the server bind right away; /readyz reports when the model is warm.
+    loading = asyncio.create_task(_start_in_background())
+    watching = asyncio.create_task(_watch_model_file(loading))
+    yield
+    watching.cancel()
+    await loading
+    await model_swapper.close()
+    await batcher.close()
+    decode_pool.shutdown()
+    inference_pool.shutdown()
+    if shm_client is not None:
+        shm_client.close()
+    if similarity_index is not None:
+        similarity_index.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Multipart boundaries and part headers around a single image upload.
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+settings = load_settings()
 
 # Allow CORS (so frontend can call API from browser)
 app.add_middleware(
@@ -20,544 +93,937 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# Cut oversized bodies off while they stream in, before multipart parsing spools them.
+app.add_middleware(BodySizeLimitMiddleware, limits={
+    "/api/analyze-breed": settings.max_image_bytes + MULTIPART_OVERHEAD_BYTES,
+    "/api/analyze-breed/bulk": settings.max_bulk_bytes,
+    "/api/analyze-herd": settings.max_image_bytes + MULTIPART_OVERHEAD_BYTES,
+    "/api/similar": settings.max_image_bytes + MULTIPART_OVERHEAD_BYTES,
+})
+
+
+@app.exception_handler(UploadTooLarge)
+async def upload_too_large(request: Request, exc: UploadTooLarge):
+    ERRORS.inc(exception=type(exc).__name__)
+    return JSONResponse(status_code=exc.status_code, content={"error": exc.detail})
 
 # ----------------------------------------------------
 # Load ONNX Model
 # ----------------------------------------------------
-onnx_model_path = r"C:\Users\LENOVO\Desktop\SIH\src\bovine_model.onnx"
-session = ort.InferenceSession(onnx_model_path)
-
-# Comprehensive breed information
-BREED_INFO = {
-    "Holstein": {
-        "confidence": 0.92,
-        "type": "Dairy",
-        "description": "Large black and white spotted cattle, excellent milk producers.",
-        "origin": "Netherlands",
-        "average_weight": "Cows: 1,400-1,500 lbs, Bulls: 2,400-2,800 lbs",
-        "milk_production": "22,000-25,000 lbs per year",
-        "temperament": "Generally docile and easy to handle",
-        "primary_uses": "Primarily dairy, some crossbreeding for beef",
-        "care_requirements": "Requires high-quality feed and regular milking schedule"
-    },
-    "Alambadi": {
-        "confidence": 0.87,
-        "type": "Draft/Draught",
-        "description": "Medium-sized draught cattle with grey coat and compact build.",
-        "origin": "Tamil Nadu, India",
-        "average_weight": "Cows: 700-800 lbs, Bulls: 1,100-1,300 lbs",
-        "milk_production": "1,500-2,000 lbs per year",
-        "temperament": "Hardy and docile, good working cattle",
-        "primary_uses": "Agricultural work, moderate milk production",
-        "care_requirements": "Adapted to hot climate, requires minimal care"
-    },
-    "Amritmahal": {
-        "confidence": 0.89,
-        "type": "Dual Purpose",
-        "description": "Grey cattle with long horns, known for strength and endurance.",
-        "origin": "Karnataka, India",
-        "average_weight": "Cows: 800-900 lbs, Bulls: 1,200-1,400 lbs",
-        "milk_production": "2,200-3,000 lbs per year",
-        "temperament": "Active and strong, good for work",
-        "primary_uses": "Draft work, milk production, beef",
-        "care_requirements": "Heat tolerant, requires moderate nutrition"
-    },
-    "Ayrshire": {
-        "confidence": 0.91,
-        "type": "Dairy",
-        "description": "Red and white spotted dairy cattle with excellent milk quality.",
-        "origin": "Scotland",
-        "average_weight": "Cows: 1,200-1,300 lbs, Bulls: 1,800-2,000 lbs",
-        "milk_production": "17,000-20,000 lbs per year",
-        "temperament": "Alert but gentle, easy to manage",
-        "primary_uses": "High-quality milk production",
-        "care_requirements": "Requires good pasture and regular milking"
-    },
-    "Banni": {
-        "confidence": 0.86,
-        "type": "Draft",
-        "description": "Large grey buffalo breed known for exceptional strength.",
-        "origin": "Gujarat, India",
-        "average_weight": "Cows: 1,100-1,200 lbs, Bulls: 1,600-1,800 lbs",
-        "milk_production": "3,500-4,500 lbs per year",
-        "temperament": "Robust and powerful",
-        "primary_uses": "Heavy draft work, milk production",
-        "care_requirements": "Suited to dry regions, needs adequate water"
-    },
-    "Bargur": {
-        "confidence": 0.84,
-        "type": "Dual Purpose",
-        "description": "Small to medium-sized cattle with grey to white coat.",
-        "origin": "Tamil Nadu, India",
-        "average_weight": "Cows: 600-700 lbs, Bulls: 900-1,000 lbs",
-        "milk_production": "1,800-2,200 lbs per year",
-        "temperament": "Hardy and adaptable",
-        "primary_uses": "Milk production, light draft work",
-        "care_requirements": "Well adapted to hilly terrain"
-    },
-    "Bhadawari": {
-        "confidence": 0.88,
-        "type": "Dairy",
-        "description": "Buffalo breed with high butterfat content milk.",
-        "origin": "Uttar Pradesh, India",
-        "average_weight": "Cows: 900-1,000 lbs, Bulls: 1,200-1,400 lbs",
-        "milk_production": "4,000-5,000 lbs per year",
-        "temperament": "Calm and manageable",
-        "primary_uses": "High-fat milk production",
-        "care_requirements": "Requires good feeding and water access"
-    },
-    "Brown_Swiss": {
-        "confidence": 0.90,
-        "type": "Dual Purpose",
-        "description": "Large brown cattle known for longevity and milk production.",
-        "origin": "Switzerland",
-        "average_weight": "Cows: 1,400-1,500 lbs, Bulls: 2,200-2,500 lbs",
-        "milk_production": "20,000-22,000 lbs per year",
-        "temperament": "Docile and long-lived",
-        "primary_uses": "Milk production, beef",
-        "care_requirements": "Requires quality feed and good management"
-    },
-    "Dangi": {
-        "confidence": 0.83,
-        "type": "Draft",
-        "description": "Medium-sized draught cattle with greyish coat.",
-        "origin": "Maharashtra, India",
-        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,200 lbs",
-        "milk_production": "1,600-2,000 lbs per year",
-        "temperament": "Hardy and hardworking",
-        "primary_uses": "Agricultural operations, moderate milk",
-        "care_requirements": "Well adapted to harsh conditions"
-    },
-    "Deoni": {
-        "confidence": 0.87,
-        "type": "Dual Purpose",
-        "description": "Medium-sized cattle with characteristic white markings.",
-        "origin": "Maharashtra/Karnataka, India",
-        "average_weight": "Cows: 800-900 lbs, Bulls: 1,100-1,300 lbs",
-        "milk_production": "2,500-3,200 lbs per year",
-        "temperament": "Docile and easy to handle",
-        "primary_uses": "Milk production, draft work",
-        "care_requirements": "Heat tolerant, moderate feed requirements"
-    },
-    "Gir": {
-        "confidence": 0.93,
-        "type": "Dairy",
-        "description": "White to red cattle with distinctive curved horns and forehead.",
-        "origin": "Gujarat, India",
-        "average_weight": "Cows: 700-800 lbs, Bulls: 1,200-1,400 lbs",
-        "milk_production": "3,000-4,500 lbs per year",
-        "temperament": "Gentle and calm",
-        "primary_uses": "High-quality milk production",
-        "care_requirements": "Heat resistant, good grazing ability"
-    },
-    "Guernsey": {
-        "confidence": 0.89,
-        "type": "Dairy",
-        "description": "Golden-colored dairy cattle producing rich, creamy milk.",
-        "origin": "Channel Islands",
-        "average_weight": "Cows: 1,100-1,200 lbs, Bulls: 1,700-1,900 lbs",
-        "milk_production": "14,000-16,000 lbs per year",
-        "temperament": "Docile and friendly",
-        "primary_uses": "High-quality milk with golden color",
-        "care_requirements": "Requires good pasture and care"
-    },
-    "Hallikar": {
-        "confidence": 0.85,
-        "type": "Draft",
-        "description": "Medium-sized draught cattle with grey coat and strong build.",
-        "origin": "Karnataka, India",
-        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,200 lbs",
-        "milk_production": "1,800-2,200 lbs per year",
-        "temperament": "Strong and hardworking",
-        "primary_uses": "Agricultural work, moderate milk",
-        "care_requirements": "Hardy breed, minimal care needed"
-    },
-    "Hariana": {
-        "confidence": 0.88,
-        "type": "Dual Purpose",
-        "description": "White to light grey cattle with good milk and draft qualities.",
-        "origin": "Haryana, India",
-        "average_weight": "Cows: 800-900 lbs, Bulls: 1,200-1,400 lbs",
-        "milk_production": "2,800-3,500 lbs per year",
-        "temperament": "Docile and manageable",
-        "primary_uses": "Milk production, draft work",
-        "care_requirements": "Heat tolerant, good foraging ability"
-    },
-    "Jaffrabadi": {
-        "confidence": 0.91,
-        "type": "Dairy",
-        "description": "Large buffalo breed with high milk production capacity.",
-        "origin": "Gujarat, India",
-        "average_weight": "Cows: 1,200-1,400 lbs, Bulls: 1,800-2,200 lbs",
-        "milk_production": "5,500-7,000 lbs per year",
-        "temperament": "Calm but large and powerful",
-        "primary_uses": "High milk production",
-        "care_requirements": "Requires ample feed and water"
-    },
-    "Jersey": {
-        "confidence": 0.94,
-        "type": "Dairy",
-        "description": "Small fawn-colored cattle producing rich, high-fat milk.",
-        "origin": "Jersey Island",
-        "average_weight": "Cows: 900-1,000 lbs, Bulls: 1,400-1,600 lbs",
-        "milk_production": "13,000-17,000 lbs per year",
-        "temperament": "Gentle and easy to handle",
-        "primary_uses": "High-butterfat milk production",
-        "care_requirements": "Requires quality feed, heat sensitive"
-    },
-    "Kangayam": {
-        "confidence": 0.86,
-        "type": "Draft",
-        "description": "Red draught cattle known for their working ability.",
-        "origin": "Tamil Nadu, India",
-        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,200 lbs",
-        "milk_production": "1,500-2,000 lbs per year",
-        "temperament": "Strong and active",
-        "primary_uses": "Heavy agricultural work",
-        "care_requirements": "Heat tolerant, good working stamina"
-    },
-    "Kankrej": {
-        "confidence": 0.90,
-        "type": "Dual Purpose",
-        "description": "Large silver-grey cattle with long horns and good milk yield.",
-        "origin": "Gujarat/Rajasthan, India",
-        "average_weight": "Cows: 800-950 lbs, Bulls: 1,300-1,500 lbs",
-        "milk_production": "3,200-4,000 lbs per year",
-        "temperament": "Hardy and robust",
-        "primary_uses": "Milk production, draft work",
-        "care_requirements": "Drought resistant, good grazing ability"
-    },
-    "Kasargod": {
-        "confidence": 0.82,
-        "type": "Dual Purpose",
-        "description": "Small to medium cattle with reddish-brown coat.",
-        "origin": "Kerala, India",
-        "average_weight": "Cows: 600-700 lbs, Bulls: 850-950 lbs",
-        "milk_production": "2,000-2,500 lbs per year",
-        "temperament": "Docile and manageable",
-        "primary_uses": "Milk production, light work",
-        "care_requirements": "Adapted to coastal climate"
-    },
-    "Kenkatha": {
-        "confidence": 0.84,
-        "type": "Dual Purpose",
-        "description": "Medium-sized cattle with grey to white coat coloration.",
-        "origin": "Madhya Pradesh, India",
-        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,250 lbs",
-        "milk_production": "2,200-2,800 lbs per year",
-        "temperament": "Hardy and adaptable",
-        "primary_uses": "Milk production, agricultural work",
-        "care_requirements": "Well suited to dry regions"
-    },
-    "Kherigarh": {
-        "confidence": 0.81,
-        "type": "Draft",
-        "description": "Medium-sized draught cattle with good working capacity.",
-        "origin": "Uttar Pradesh, India",
-        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,150 lbs",
-        "milk_production": "1,800-2,200 lbs per year",
-        "temperament": "Strong and hardworking",
-        "primary_uses": "Agricultural operations",
-        "care_requirements": "Hardy breed, moderate care needed"
-    },
-    "Khillari": {
-        "confidence": 0.83,
-        "type": "Draft",
-        "description": "Grey draught cattle known for their speed and agility.",
-        "origin": "Maharashtra/Karnataka, India",
-        "average_weight": "Cows: 650-750 lbs, Bulls: 950-1,100 lbs",
-        "milk_production": "1,500-2,000 lbs per year",
-        "temperament": "Active and fast-moving",
-        "primary_uses": "Fast agricultural work, cart pulling",
-        "care_requirements": "Heat tolerant, good foraging"
-    },
-    "Krishna_Valley": {
-        "confidence": 0.85,
-        "type": "Dual Purpose",
-        "description": "Large cattle breed with good milk and draft capabilities.",
-        "origin": "Andhra Pradesh/Karnataka, India",
-        "average_weight": "Cows: 850-950 lbs, Bulls: 1,250-1,450 lbs",
-        "milk_production": "2,800-3,500 lbs per year",
-        "temperament": "Docile and strong",
-        "primary_uses": "Milk production, heavy work",
-        "care_requirements": "Requires good nutrition and care"
-    },
-    "Malnad_gidda": {
-        "confidence": 0.80,
-        "type": "Dual Purpose",
-        "description": "Small hill cattle adapted to forest regions.",
-        "origin": "Karnataka, India",
-        "average_weight": "Cows: 550-650 lbs, Bulls: 750-850 lbs",
-        "milk_production": "1,800-2,200 lbs per year",
-        "temperament": "Hardy and sure-footed",
-        "primary_uses": "Hill farming, moderate milk",
-        "care_requirements": "Well adapted to hilly terrain"
-    },
-    "Mehsana": {
-        "confidence": 0.92,
-        "type": "Dairy",
-        "description": "Buffalo breed with excellent milk production and quality.",
-        "origin": "Gujarat, India",
-        "average_weight": "Cows: 1,000-1,200 lbs, Bulls: 1,500-1,800 lbs",
-        "milk_production": "5,000-6,500 lbs per year",
-        "temperament": "Gentle and productive",
-        "primary_uses": "High milk production",
-        "care_requirements": "Requires good feeding and management"
-    },
-    "Murrah": {
-        "confidence": 0.95,
-        "type": "Dairy",
-        "description": "Black buffalo breed, world's best dairy buffalo.",
-        "origin": "Haryana, India",
-        "average_weight": "Cows: 1,100-1,300 lbs, Bulls: 1,600-2,000 lbs",
-        "milk_production": "6,000-8,000 lbs per year",
-        "temperament": "Docile and highly productive",
-        "primary_uses": "Superior milk production",
-        "care_requirements": "Requires excellent feeding and care"
-    },
-    "Nagori": {
-        "confidence": 0.87,
-        "type": "Dual Purpose",
-        "description": "White to light grey cattle with good drought resistance.",
-        "origin": "Rajasthan, India",
-        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,300 lbs",
-        "milk_production": "2,500-3,200 lbs per year",
-        "temperament": "Hardy and resilient",
-        "primary_uses": "Milk production, work in arid regions",
-        "care_requirements": "Excellent drought tolerance"
-    },
-    "Nagpuri": {
-        "confidence": 0.84,
-        "type": "Draft",
-        "description": "Medium-sized working cattle with grey coat.",
-        "origin": "Maharashtra, India",
-        "average_weight": "Cows: 700-800 lbs, Bulls: 1,000-1,200 lbs",
-        "milk_production": "1,600-2,000 lbs per year",
-        "temperament": "Strong and dependable",
-        "primary_uses": "Agricultural work, moderate milk",
-        "care_requirements": "Hardy and low maintenance"
-    },
-    "Nili_Ravi": {
-        "confidence": 0.93,
-        "type": "Dairy",
-        "description": "High-producing buffalo breed with distinctive blue eyes.",
-        "origin": "Punjab, Pakistan/India",
-        "average_weight": "Cows: 1,200-1,400 lbs, Bulls: 1,800-2,200 lbs",
-        "milk_production": "6,500-8,500 lbs per year",
-        "temperament": "Docile and highly productive",
-        "primary_uses": "Premium milk production",
-        "care_requirements": "Requires intensive management"
-    },
-    "Nimari": {
-        "confidence": 0.82,
-        "type": "Dual Purpose",
-        "description": "Medium-sized cattle with good adaptability to harsh conditions.",
-        "origin": "Madhya Pradesh, India",
-        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,250 lbs",
-        "milk_production": "2,200-2,800 lbs per year",
-        "temperament": "Hardy and adaptable",
-        "primary_uses": "Milk production, draft work",
-        "care_requirements": "Well suited to semi-arid regions"
-    },
-    "Ongole": {
-        "confidence": 0.91,
-        "type": "Dual Purpose",
-        "description": "Large white cattle with distinctive hump and long legs.",
-        "origin": "Andhra Pradesh, India",
-        "average_weight": "Cows: 900-1,000 lbs, Bulls: 1,400-1,600 lbs",
-        "milk_production": "2,800-3,500 lbs per year",
-        "temperament": "Docile but large and strong",
-        "primary_uses": "Milk production, draft work, beef",
-        "care_requirements": "Heat tolerant, good grazing ability"
-    },
-    "Pulikulam": {
-        "confidence": 0.83,
-        "type": "Dual Purpose",
-        "description": "Small to medium cattle with reddish-brown coat and good heat tolerance.",
-        "origin": "Tamil Nadu, India",
-        "average_weight": "Cows: 650-750 lbs, Bulls: 900-1,050 lbs",
-        "milk_production": "2,000-2,500 lbs per year",
-        "temperament": "Hardy and manageable",
-        "primary_uses": "Milk production, light draft work",
-        "care_requirements": "Excellent heat tolerance"
-    },
-    "Rathi": {
-        "confidence": 0.86,
-        "type": "Dual Purpose",
-        "description": "White cattle with brown patches, good milk and draft qualities.",
-        "origin": "Rajasthan, India",
-        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,300 lbs",
-        "milk_production": "2,800-3,500 lbs per year",
-        "temperament": "Docile and hardworking",
-        "primary_uses": "Milk production, agricultural work",
-        "care_requirements": "Drought resistant, hardy breed"
-    },
-    "Red_Dane": {
-        "confidence": 0.88,
-        "type": "Dairy",
-        "description": "Red dairy cattle with good milk production and quality.",
-        "origin": "Denmark",
-        "average_weight": "Cows: 1,300-1,400 lbs, Bulls: 2,000-2,300 lbs",
-        "milk_production": "18,000-21,000 lbs per year",
-        "temperament": "Calm and productive",
-        "primary_uses": "High-quality milk production",
-        "care_requirements": "Requires good management and feeding"
-    },
-    "Red_Sindhi": {
-        "confidence": 0.89,
-        "type": "Dual Purpose",
-        "description": "Red cattle known for heat tolerance and good milk production.",
-        "origin": "Sindh region (Pakistan/India)",
-        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,300 lbs",
-        "milk_production": "3,000-4,000 lbs per year",
-        "temperament": "Docile and heat tolerant",
-        "primary_uses": "Milk production in hot climates",
-        "care_requirements": "Excellent heat resistance"
-    },
-    "Sahiwal": {
-        "confidence": 0.92,
-        "type": "Dairy",
-        "description": "Reddish-brown cattle, one of the best dairy breeds of India.",
-        "origin": "Punjab, Pakistan/India",
-        "average_weight": "Cows: 800-900 lbs, Bulls: 1,200-1,400 lbs",
-        "milk_production": "4,000-5,500 lbs per year",
-        "temperament": "Gentle and highly productive",
-        "primary_uses": "High milk production, heat tolerance",
-        "care_requirements": "Heat resistant, good feed conversion"
-    },
-    "Surti": {
-        "confidence": 0.90,
-        "type": "Dairy",
-        "description": "Buffalo breed with good milk production and butterfat content.",
-        "origin": "Gujarat, India",
-        "average_weight": "Cows: 900-1,100 lbs, Bulls: 1,300-1,600 lbs",
-        "milk_production": "4,500-6,000 lbs per year",
-        "temperament": "Docile and manageable",
-        "primary_uses": "Quality milk production",
-        "care_requirements": "Requires adequate nutrition"
-    },
-    "Tharparkar": {
-        "confidence": 0.87,
-        "type": "Dual Purpose",
-        "description": "White to light grey cattle adapted to arid conditions.",
-        "origin": "Rajasthan/Sindh",
-        "average_weight": "Cows: 750-850 lbs, Bulls: 1,100-1,300 lbs",
-        "milk_production": "2,500-3,200 lbs per year",
-        "temperament": "Hardy and drought resistant",
-        "primary_uses": "Milk production in desert regions",
-        "care_requirements": "Excellent drought tolerance"
-    },
-    "Toda": {
-        "confidence": 0.79,
-        "type": "Dairy",
-        "description": "Small hill cattle with good milk quality, rare breed.",
-        "origin": "Tamil Nadu (Nilgiri Hills), India",
-        "average_weight": "Cows: 500-600 lbs, Bulls: 700-800 lbs",
-        "milk_production": "1,200-1,800 lbs per year",
-        "temperament": "Docile and hardy",
-        "primary_uses": "High-quality milk in hilly areas",
-        "care_requirements": "Adapted to cool hill climate"
-    },
-    "Umblachery": {
-        "confidence": 0.81,
-        "type": "Draft",
-        "description": "Grey draught cattle suitable for wet land cultivation.",
-        "origin": "Tamil Nadu, India",
-        "average_weight": "Cows: 650-750 lbs, Bulls: 900-1,050 lbs",
-        "milk_production": "1,500-2,000 lbs per year",
-        "temperament": "Strong and suitable for paddy fields",
-        "primary_uses": "Wet land cultivation, moderate milk",
-        "care_requirements": "Well adapted to wet conditions"
-    },
-    "Vechur": {
-        "confidence": 0.85,
-        "type": "Dairy",
-        "description": "World's smallest cattle breed with high-quality milk.",
-        "origin": "Kerala, India",
-        "average_weight": "Cows: 290-350 lbs, Bulls: 400-500 lbs",
-        "milk_production": "900-1,500 lbs per year",
-        "temperament": "Very gentle and manageable",
-        "primary_uses": "High-quality milk, ornamental",
-        "care_requirements": "Requires minimal space and feed"
-    }
-}
+thread_plan = plan_threads(settings)
+startup = Startup()
+
+onnx_model_path = resolve_model_path(settings)
+
+if settings.inference_backend not in ("local", "shm"):
+    raise ValueError(f"Unsupported inference backend: {settings.inference_backend!r} (expected 'local' or 'shm')")
+# The shm backend runs one batch per ring slot; a local session runs inference_workers at once.
+inference_concurrency = settings.shm_slots if settings.inference_backend == "shm" else thread_plan.inference_workers
+# Enough analyze requests at once to keep every inference slot's next batch full too.
+admission = AdmissionController(
+    settings.admission_max_concurrency or 2 * inference_concurrency * settings.batch_max_size,
+    settings.admission_max_queue,
+)
+# The uint8 model variant takes (N,224,224,3) pixels and normalizes in-graph,
+# so preprocessing stops at the resize.
+MODEL_TAKES_PIXELS = settings.model_input == "uint8"
+
+# Filled in by load_model() from the background startup task.
+# Model output rows are packed as [class scores | embedding]; EMBEDDING_DIM is 0
+# when the model doesn't expose an embedding.
+session = None
+input_name = None
+output_names: List[str] = []
+MODEL_BATCH_LIMIT = None
+shm_client = None
+run_batch = None
+BREED_LABELS: List[str] = []
+NUM_CLASSES = 0
+EMBEDDING_DIM = 0
+similarity_index = None
+
+
+def _run_session(model, batch: np.ndarray) -> np.ndarray:
+    return np.concatenate(model.run(output_names, {input_name: batch}), axis=1)
+
+
+def run_local_batch(batch: np.ndarray, model=None) -> np.ndarray:
+    """Run an (N,3,224,224) batch through the live session (or ``model``); returns (N, classes + embedding)."""
+    # Read the live session once, so a batch that started before a hot swap finishes on the old model.
+    model = session if model is None else model
+    return run_in_chunks(partial(_run_session, model), batch, MODEL_BATCH_LIMIT)
+
+
+def run_scored_batch(batch: np.ndarray) -> np.ndarray:
+    """Run a batch and turn its logits into calibrated class probabilities in one vectorized pass."""
+    started = time.perf_counter()
+    outputs = run_batch(batch)
+    run_seconds = time.perf_counter() - started
+    outputs[:, :NUM_CLASSES] = softmax(outputs[:, :NUM_CLASSES], settings.score_temperature)
+    shadow = model_swapper.shadow
+    if shadow is not None:
+        shadow.offer(batch, outputs[:, :NUM_CLASSES], run_seconds)
+    return outputs
+
+
+def load_model():
+    """Create the session (or attach to the inference server), load the label table and open the similarity index."""
+    global session, input_name, output_names, MODEL_BATCH_LIMIT, shm_client, run_batch, BREED_LABELS
+    global NUM_CLASSES, EMBEDDING_DIM, similarity_index, BREEDS_RESPONSE
+
+    if settings.inference_backend == "shm":
+        # Dedicated inference processes own the sessions (see inference_server.py);
+        # this worker only stacks batches into shared memory.
+        from inference_server import ShmInferenceClient
+
+        with startup.phase("connect_inference_server"):
+            shm_client = ShmInferenceClient(settings.shm_socket_path, settings.shm_slots, settings.batch_max_size)
+        if shm_client.input_dtype != ("uint8" if MODEL_TAKES_PIXELS else "float32"):
+            raise ValueError(f"Inference server model takes {shm_client.input_dtype} input, but "
+                             f"CATTLE_MODEL_INPUT is {settings.model_input}")
+        batcher.add_buffers(shm_client.buffers)
+        run_batch = shm_client.run_batch
+        model_classes = shm_client.output_dim
+        embedding_dim = shm_client.embedding_dim
+    else:
+        # Imported here so onnxruntime loads in the background, not on the import path.
+        from session_factory import EMBEDDING_OUTPUT, create_session
+
+        with startup.phase("load_model"):
+            load_started = time.perf_counter()
+            session = create_session(settings, thread_plan.ort_intra_op_threads)
+            load_seconds = time.perf_counter() - load_started
+        input_name = session.get_inputs()[0].name
+        outputs = session.get_outputs()
+        embedding = next((output for output in outputs[1:] if output.name == EMBEDDING_OUTPUT), None)
+        output_names = [outputs[0].name] + ([embedding.name] if embedding is not None else [])
+        embedding_dim = embedding.shape[-1] if embedding is not None else 0
+        MODEL_BATCH_LIMIT = batch_limit(session)
+        run_batch = run_local_batch
+        model_classes = session.get_outputs()[0].shape[-1]
+
+    # Fail at startup, not per request, when the label table doesn't fit the model.
+    with startup.phase("load_labels"):
+        labels = load_labels(
+            settings.labels_path or default_labels_path(settings.model_path),
+            model_classes if isinstance(model_classes, int) else None,
+        )
+        unknown = set(labels) - BREED_INFO.keys()
+        if unknown:
+            raise ValueError(f"Model labels missing from BREED_INFO: {', '.join(sorted(unknown))}")
+    BREED_LABELS = labels
+    NUM_CLASSES = len(labels)
+    BREEDS_RESPONSE = build_breeds_response(labels)
+    EMBEDDING_DIM = embedding_dim if isinstance(embedding_dim, int) else 0
+
+    with startup.phase("open_similarity_index"):
+        digest = model_digest(onnx_model_path)
+        similarity_index = open_index(settings.similarity_index_dir, onnx_model_path, EMBEDDING_DIM, digest)
+    prediction_cache.model_version = digest
+    if session is not None:
+        model_swapper.live = ModelVersion(session, onnx_model_path, digest, load_seconds, similarity_index)
+
+
+def _blank_batch(size: int) -> np.ndarray:
+    if MODEL_TAKES_PIXELS:
+        return np.zeros((size, 224, 224, 3), dtype=np.uint8)
+    return np.zeros((size, 3, 224, 224), dtype=np.float32)
+
+
+def warm_up():
+    """Run a single image and a full batch so ORT's lazy init and first-run allocations happen before traffic."""
+    for size in sorted({1, settings.batch_max_size}):
+        with startup.phase(f"warm_up_batch_{size}"):
+            run_scored_batch(_blank_batch(size))
+
+
+def start_model():
+    """Load, check and warm the model, then mark the worker ready."""
+    load_model()
+    warm_up()
+    startup.mark_ready()
+
+
+# ----------------------------------------------------
+# Hot Model Swap (local backend)
+# ----------------------------------------------------
+def _model_signature(model) -> tuple:
+    return (
+        [(i.name, i.type, i.shape) for i in model.get_inputs()],
+        [(o.name, o.type, o.shape) for o in model.get_outputs()],
+    )
+
+
+def build_model_version() -> ModelVersion:
+    """Load and warm the model file as it is now, next to the live one; runs in a worker thread."""
+    from session_factory import create_session
+
+    started = time.perf_counter()
+    digest = model_digest(onnx_model_path)
+    candidate = create_session(settings, thread_plan.ort_intra_op_threads)
+    # The label table, batch limit and output packing were fixed at startup.
+    if _model_signature(candidate) != _model_signature(session):
+        raise ValueError("The new model's inputs or outputs differ from the live model's; restart to serve it")
+    for size in sorted({1, settings.batch_max_size}):
+        run_local_batch(_blank_batch(size), candidate)
+    live = model_swapper.live
+    if live is not None and digest == live.digest:
+        index = live.similarity_index  # same weights: keep appending to the same index
+    else:
+        index = open_index(settings.similarity_index_dir, onnx_model_path, EMBEDDING_DIM, digest)
+    return ModelVersion(candidate, onnx_model_path, digest, time.perf_counter() - started, index)
+
+
+def activate_model_version(version: ModelVersion):
+    """Point new batches at ``version``; batches already running finish on the old session."""
+    global session, similarity_index
+    session = version.session
+    similarity_index = version.similarity_index
+    prediction_cache.invalidate(version.digest)
+
+
+def release_model_version(version: ModelVersion):
+    # The session itself is freed once the last batch holding it returns.
+    if version.similarity_index is not None and version.similarity_index is not similarity_index:
+        version.similarity_index.close()
+
+
+def score_candidate(version: ModelVersion, batch: np.ndarray) -> np.ndarray:
+    """Class probabilities from a shadowed candidate, computed exactly as for the live model."""
+    return softmax(run_local_batch(batch, version.session)[:, :NUM_CLASSES], settings.score_temperature)
 
-# List of all breed names for random selection
+
+model_swapper = ModelSwapper(build_model_version, activate_model_version, score_candidate, release_model_version)
+
+
+async def _reload_changed_model() -> bool:
+    # Without the admin API nothing could promote or discard a shadowed candidate.
+    fraction = settings.model_shadow_fraction if settings.admin_token else 0.0
+    task = model_swapper.start_reload(fraction)
+    if task is None:
+        return False
+    await task
+    return True
+
+
+prediction_cache = PredictionCache(
+    max_bytes=settings.cache_max_bytes,
+    ttl_seconds=settings.cache_ttl_seconds,
+    model_path=onnx_model_path,
+    perceptual=settings.cache_perceptual,
+    max_hamming=settings.cache_max_hamming,
+)
+
+# ----------------------------------------------------
+# Worker Pools (keep decode and inference off the event loop)
+# ----------------------------------------------------
+decode_pool = BoundedExecutor(
+    settings.decode_executor,
+    workers=thread_plan.decode_workers,
+    max_queue=settings.executor_max_queue,
+    name="decode",
+)
+# ORT releases the GIL during session.run (and the shm client just waits on a
+# socket), so inference always uses threads.
+inference_pool = BoundedExecutor(
+    "thread",
+    workers=inference_concurrency,
+    max_queue=0,
+    name="inference",
+)
+
+def _observe_batch(size: int, run_seconds: float):
+    BATCH_SIZE.observe(size)
+    BATCH_SECONDS.observe(run_seconds)
+
+
+batcher = MicroBatcher(
+    run_scored_batch,
+    max_batch_size=settings.batch_max_size,
+    max_wait_ms=settings.batch_max_wait_ms,
+    # One in-flight batch per pool worker, so the pool's bound is never hit but its load is counted.
+    executor=inference_pool,
+    max_inflight_batches=inference_concurrency,
+    on_batch=_observe_batch,
+    # The shm backend adds its shared-memory slots once connected.
+)
+
+# Every breed in the catalogue; the model predicts only those in its label table.
 BREED_NAMES = list(BREED_INFO.keys())
 
+
+def build_breeds_response(model_breeds: List[str]) -> PreparedResponse:
+    return PreparedResponse(
+        {"breeds": BREED_NAMES, "total_count": len(BREED_NAMES), "model_breeds": model_breeds},
+        max_age=settings.catalogue_max_age,
+    )
+
+
+# Catalogue responses only change once, when the label table loads: encode them once, with ETags.
+BREED_INDEX = build_breed_index(BREED_NAMES)
+BREEDS_RESPONSE = build_breeds_response([])
+BREED_RESPONSES = {
+    name: PreparedResponse({"breed": name, "info": info}, max_age=settings.catalogue_max_age)
+    for name, info in BREED_INFO.items()
+}
+
 # ----------------------------------------------------
-# Helper Function for Preprocessing
+# Helper Function for Building Predictions
 # ----------------------------------------------------
-def preprocess_image(image: Image.Image, size=(224, 224)):
-    """Resize, normalize, and convert image to tensor format for ONNX model."""
-    image = image.convert("RGB").resize(size)
-    img_array = np.array(image).astype(np.float32) / 255.0  # Normalize [0,1]
-    img_array = np.transpose(img_array, (2, 0, 1))  # (H,W,C) → (C,H,W)
-    img_array = np.expand_dims(img_array, axis=0)   # Add batch dimension → (1,C,H,W)
-    return img_array
+def build_prediction(scores: np.ndarray, top_k: int = 1, with_info: bool = True) -> dict:
+    """Turn one row of class probabilities into the breed / confidence / info response body.
+
+    With top_k > 1 the best alternatives are listed too, most likely first.
+    """
+    indices, confidences = top_k_classes(scores[..., :NUM_CLASSES], top_k)
+    breed_name = BREED_LABELS[indices[0, 0]]
+    prediction = {
+        "breed": breed_name,
+        "confidence": round(float(confidences[0, 0]), 4),
+    }
+    if with_info:
+        prediction["info"] = BREED_INFO.get(breed_name, {})
+    if top_k > 1:
+        prediction["top_k"] = [
+            {"breed": BREED_LABELS[index], "confidence": round(float(confidence), 4)}
+            for index, confidence in zip(indices[0], confidences[0])
+        ]
+    return prediction
+
+ALLOWED_IMAGE_FORMATS = frozenset(
+    name.strip().upper() for name in settings.allowed_image_formats.split(",") if name.strip()
+)
+
+
+def _admit(contents: bytes, timer: StageTimer, sniff: bool = True):
+    """Checks every image goes through before it costs a decode."""
+    if not startup.ready:
+        raise NotReady("Model is still loading, please retry shortly")
+    IMAGE_BYTES.observe(len(contents))
+    if sniff:
+        with timer.stage("sniff"):
+            sniff_image(contents, ALLOWED_IMAGE_FORMATS, settings.max_image_pixels)
+
+
+async def _decode(contents: bytes, timer: StageTimer, decoder=decode_and_preprocess_timed, *args) -> np.ndarray:
+    started = time.perf_counter()
+    input_tensor, info = await decode_pool.run(partial(decoder, pixels=MODEL_TAKES_PIXELS), contents, *args)
+    timer.add("decode", info["decode"])
+    timer.add("preprocess", info["preprocess"])
+    # Time spent waiting for a decode worker rather than working.
+    timer.add("decode_wait", max(0.0, time.perf_counter() - started - info["decode"] - info["preprocess"]))
+    IMAGE_MEGAPIXELS.observe(info["width"] * info["height"] / 1e6)
+    return input_tensor
+
+
+async def _prepare(contents: bytes, timer: StageTimer, raw_input: Optional[Tuple[str, str]]) -> np.ndarray:
+    if raw_input is None:
+        return await _decode(contents, timer)
+    # Already 224x224: wrapping the bytes is cheap enough for the event loop.
+    with timer.stage("preprocess"):
+        return load_pixel_upload(contents, *raw_input, pixels=MODEL_TAKES_PIXELS)
+
+
+async def classify_bytes(
+    contents: bytes,
+    timer: Optional[StageTimer] = None,
+    deadline: Optional[float] = None,
+    raw_input: Optional[Tuple[str, str]] = None,
+) -> np.ndarray:
+    """Return the class probabilities for uploaded image bytes, using the prediction cache.
+
+    ``raw_input`` is a (format, layout) pair for pre-decoded pixels (see
+    load_pixel_upload) instead of an encoded image. Raises ImageRejected for
+    unsupported, oversized or corrupt images, and DeadlineExceeded when
+    ``deadline`` passes before inference starts.
+    """
+    timer = timer or StageTimer()
+    _admit(contents, timer, sniff=raw_input is None)
+    if not prediction_cache.enabled:
+        input_tensor = await _prepare(contents, timer, raw_input)
+        with timer.stage("inference"):
+            return await batcher.submit(input_tensor, deadline)
+
+    # Predictions are cached only if this model version is still live when they come back.
+    model_version = prediction_cache.model_version
+    with timer.stage("cache"):
+        # The same bytes mean different pixels under another raw format, layout or model input.
+        variant = settings.model_input if raw_input is None else "/".join((settings.model_input, *raw_input))
+        key = prediction_cache.key_for(contents, variant)
+        preds = prediction_cache.get(key)
+    if preds is not None:
+        return preds
+
+    input_tensor = await _prepare(contents, timer, raw_input)
+    preds = prediction_cache.get_similar(input_tensor)
+    if preds is None:
+        # Run inference (batched with other in-flight uploads); includes the micro-batch wait
+        with timer.stage("inference"):
+            preds = await batcher.submit(input_tensor, deadline)
+    prediction_cache.put(key, preds, input_tensor, model_version)
+    return preds
+
+
+async def classify_views(
+    contents: bytes, views: int, timer: StageTimer, deadline: Optional[float] = None,
+) -> Tuple[np.ndarray, dict]:
+    """Test-time augmentation: score several views of one image together and average their probabilities.
+
+    The views are queued on the micro-batcher as one stack, so they share
+    session.run calls rather than costing one call each. Not cached.
+    """
+    _admit(contents, timer)
+    views = min(views, settings.tta_max_views, len(TTA_VIEWS))
+    batch = await _decode(contents, timer, decode_and_preprocess_views_timed, views)
+    with timer.stage("inference"):
+        scores = await batcher.submit_many(batch, deadline)
+    return scores.mean(axis=0), {"views": len(batch), "inference_ms": round(1000 * timer.stages["inference"], 2)}
+
+def error_response(e: Exception) -> JSONResponse:
+    """Count a failed analysis and map it to its HTTP response."""
+    ERRORS.inc(exception=type(e).__name__)
+    if isinstance(e, ImageRejected):
+        return JSONResponse(status_code=e.status_code, content={"error": e.message})
+    if isinstance(e, NotReady):
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": "1"})
+    if isinstance(e, Overloaded):
+        return JSONResponse(status_code=503, content={"error": str(e)}, headers={"Retry-After": str(e.retry_after)})
+    if isinstance(e, ExecutorSaturated):
+        return JSONResponse(status_code=503, content={"error": "Server busy, please retry shortly"})
+    return JSONResponse(status_code=500, content={"error": str(e)})
+
+
+def request_deadline(x_deadline_ms: Optional[float] = Header(None, gt=0)) -> float:
+    """Deadline for an analyze request: the client's X-Deadline-Ms, else the server's latency budget.
+
+    Counted from when the upload has been received.
+    """
+    return deadline_after(x_deadline_ms, settings.latency_budget_ms)
+
+
+async def index_upload(contents: bytes, file_name: str, scores: np.ndarray, prediction: dict):
+    """Remember an analyzed upload's embedding for /api/similar, when indexing is enabled.
+
+    Hashing the upload and appending to the index files runs off the event loop.
+    """
+    if similarity_index is not None:
+        await asyncio.to_thread(similarity_index.add, scores[NUM_CLASSES:], contents, {
+            "file": file_name, "breed": prediction["breed"], "confidence": prediction["confidence"],
+        })
 
 # ----------------------------------------------------
 # API Endpoint: Analyze Breed
 # ----------------------------------------------------
 @app.post("/api/analyze-breed")
-async def analyze_breed(image: UploadFile = File(...)):
+async def analyze_breed(
+    image: UploadFile = File(...),
+    top_k: int = Query(1, ge=1),
+    tta: int = Query(0, ge=0),
+    input_format: str = Query("image", alias="input", pattern="^(image|raw|npy)$"),
+    layout: str = Query("hwc", pattern="^(hwc|chw)$"),
+    deadline: float = Depends(request_deadline),
+):
+    """Classify one upload: an encoded image, or (``input=raw`` / ``input=npy``) pixels already resized to 224x224."""
+    timer = StageTimer()
+    raw_input = None if input_format == "image" else (input_format, layout)
     try:
+        if raw_input is not None and tta > 1:
+            raise ImageRejected(400, "tta needs an encoded image upload")
         # Read and preprocess uploaded image
-        contents = await image.read()
-        pil_img = Image.open(io.BytesIO(contents))
-        input_tensor = preprocess_image(pil_img)
+        with timer.stage("read"):
+            contents = await read_upload(image, settings.max_image_bytes)
+        async with admission.slot(deadline):
+            if tta > 1:
+                preds, tta_info = await classify_views(contents, tta, timer, deadline)
+            else:
+                preds, tta_info = await classify_bytes(contents, timer, deadline, raw_input), None
+
+        with timer.stage("serialize"):
+            prediction = build_prediction(preds, top_k)
+            if tta_info is not None:
+                prediction["tta"] = tta_info
+            response = JSONResponse(content=prediction)
+        if tta_info is None:
+            await index_upload(contents, image.filename, preds, prediction)
+        if settings.server_timing:
+            response.headers["Server-Timing"] = timer.server_timing()
+        return response
+
+    except Exception as e:
+        return error_response(e)
+
+# ----------------------------------------------------
+# API Endpoint: Herd Photos (tiled)
+# ----------------------------------------------------
+def build_herd_prediction(scores: np.ndarray, boxes) -> dict:
+    """Per-tile predictions plus the herd-level breed mix, computed over all tiles at once."""
+    scores = scores[:, :NUM_CLASSES]
+    indices, confidences = top_k_classes(scores, 1)
+    indices, confidences = indices[:, 0].tolist(), confidences[:, 0].tolist()
+    votes = np.bincount(indices, minlength=len(BREED_LABELS))
+    mean_scores = scores.mean(axis=0)
+    return {
+        "tiles": [
+            {"x": x, "y": y, "width": w, "height": h,
+             "breed": BREED_LABELS[index], "confidence": round(confidence, 4)}
+            for (x, y, w, h), index, confidence in zip(boxes, indices, confidences)
+        ],
+        "herd": [
+            {"breed": BREED_LABELS[index], "share": round(float(mean_scores[index]), 4), "tiles": int(votes[index])}
+            for index in np.argsort(-mean_scores, kind="stable").tolist()
+        ],
+    }
+
+
+@app.post("/api/analyze-herd")
+async def analyze_herd(image: UploadFile = File(...), deadline: float = Depends(request_deadline)):
+    """Classify overlapping 224x224 tiles of a wide herd photo; not cached."""
+    timer = StageTimer()
+    try:
+        with timer.stage("read"):
+            contents = await read_upload(image, settings.max_image_bytes)
+        async with admission.slot(deadline):
+            _admit(contents, timer)
+            tiles, boxes = await _decode(contents, timer, decode_and_tile_timed, settings.tile_max_side,
+                                         settings.tile_overlap, settings.tile_max_count)
+            # Tiles queue as one stack, so they run as full micro-batches.
+            with timer.stage("inference"):
+                scores = await batcher.submit_many(tiles, deadline)
+
+        with timer.stage("serialize"):
+            prediction = build_herd_prediction(scores, boxes)
+            prediction["inference_ms"] = round(1000 * timer.stages["inference"], 2)
+            response = JSONResponse(content=prediction)
+        if settings.server_timing:
+            response.headers["Server-Timing"] = timer.server_timing()
+        return response
+
+    except Exception as e:
+        return error_response(e)
+
+# ----------------------------------------------------
+# API Endpoint: Bulk Analyze (streamed NDJSON)
+# ----------------------------------------------------
+async def _iter_uploads(first: Tuple[str, Union[bytes, ImageRejected]], parts):
+    # Parts are parsed as the body arrives and only pulled as the window frees up,
+    # so at most bulk_window images of the request are held in memory.
+    yield first
+    try:
+        async for field, filename, payload in parts:
+            if field == "images":
+                yield filename, payload
+    except (ImageRejected, UploadTooLarge) as e:
+        # The response is already streaming, so a bad or oversized body ends it with an error line.
+        status, message = (e.status_code, e.message) if isinstance(e, ImageRejected) else (413, e.detail)
+        yield None, ImageRejected(status, message)
+
+
+async def _iter_archive(archive):
+    # The upload is spooled to disk past 1 MB, so only one member is ever in memory.
+    with archive, zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                continue
+            if info.file_size > settings.max_image_bytes:
+                yield info.filename, ImageRejected(413, f"Image exceeds {settings.max_image_bytes} bytes")
+                continue
+            # A corrupt, encrypted or oddly compressed member fails on its own line, not the whole stream.
+            try:
+                contents = await asyncio.to_thread(zf.read, info)
+            except (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError) as e:
+                yield info.filename, ImageRejected(400, f"Unreadable archive member: {e}")
+                continue
+            yield info.filename, contents
+
+
+async def _classify_one(name: str, contents: Union[bytes, ImageRejected], top_k: int) -> dict:
+    if isinstance(contents, ImageRejected):
+        return {"file": name, "error": contents.message, "status": contents.status_code}
+    try:
+        preds = await classify_bytes(contents)
+        prediction = build_prediction(preds, top_k)
+        await index_upload(contents, name, preds, prediction)
+        return {"file": name, **prediction}
+    except ImageRejected as e:
+        ERRORS.inc(exception=type(e).__name__)
+        return {"file": name, "error": e.message, "status": e.status_code}
+    except NotReady as e:
+        ERRORS.inc(exception=type(e).__name__)
+        return {"file": name, "error": str(e), "status": 503}
+    except ExecutorSaturated as e:
+        ERRORS.inc(exception=type(e).__name__)
+        return {"file": name, "error": "Server busy, please retry shortly"}
+    except Exception as e:
+        ERRORS.inc(exception=type(e).__name__)
+        return {"file": name, "error": str(e)}
+
+
+async def _stream_bulk(sources, top_k: int):
+    # At most bulk_window images are read, decoded or queued at any moment;
+    # results are written in input order as soon as each one is ready.
+    window = deque()
+    try:
+        async for name, contents in sources:
+            window.append(asyncio.ensure_future(_classify_one(name, contents, top_k)))
+            if len(window) >= settings.bulk_window:
+                yield json.dumps(await window.popleft()) + "\n"
+        while window:
+            yield json.dumps(await window.popleft()) + "\n"
+    finally:
+        for task in window:
+            task.cancel()
+
+
+_BULK_FORM_SCHEMA = {
+    "requestBody": {"content": {"multipart/form-data": {"schema": {"type": "object", "properties": {
+        "images": {"type": "array", "items": {"type": "string", "format": "binary"}},
+        "archive": {"type": "string", "format": "binary"},
+    }}}}},
+}
+
+
+@app.post("/api/analyze-breed/bulk", openapi_extra=_BULK_FORM_SCHEMA)
+async def analyze_breed_bulk(request: Request, top_k: int = Query(1, ge=1)):
+    """Classify many images (multipart files or one zip archive), one NDJSON line per image.
+
+    The form is parsed incrementally rather than through File() parameters, so
+    image parts are classified while later ones are still uploading. The first
+    ``images`` or ``archive`` part decides which kind of request it is.
+    """
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        return JSONResponse(status_code=400, content={"error": "Upload images or a zip archive"})
+    try:
+        form = MultipartStream(
+            request.stream(), request.headers["content-type"], settings.max_image_bytes, spool_fields={"archive"},
+        )
+        parts = form.parts()
+        async for field, filename, payload in parts:
+            if field == "archive":
+                await parts.aclose()
+                if not zipfile.is_zipfile(payload):
+                    payload.close()
+                    return JSONResponse(status_code=400, content={"error": "archive must be a zip file"})
+                payload.seek(0)
+                sources = _iter_archive(payload)
+                break
+            if field == "images":
+                sources = _iter_uploads((filename, payload), parts)
+                break
+        else:
+            return JSONResponse(status_code=400, content={"error": "Upload images or a zip archive"})
+    except ImageRejected as e:
+        return JSONResponse(status_code=e.status_code, content={"error": e.message})
+    return UploadStreamingResponse(_stream_bulk(sources, top_k), form.finished, media_type="application/x-ndjson")
+
+# ----------------------------------------------------
+# API Endpoint: Find Similar Animals
+# ----------------------------------------------------
+@app.post("/api/similar")
+async def find_similar(
+    image: UploadFile = File(...),
+    k: int = Query(5, ge=1, le=100),
+    deadline: float = Depends(request_deadline),
+):
+    """The k previously analyzed uploads whose embeddings are closest (cosine) to this image's.
+
+    The query image itself is not added to the index.
+    """
+    # Held for the whole request: a model swap meanwhile moves new uploads to a new index.
+    index = similarity_index
+    if startup.ready and index is None:
+        return JSONResponse(status_code=501, content={"error": "Similarity search is disabled on this server"})
+    timer = StageTimer()
+    try:
+        with timer.stage("read"):
+            contents = await read_upload(image, settings.max_image_bytes)
+        async with admission.slot(deadline):
+            preds = await classify_bytes(contents, timer, deadline)
+        # Runs off the event loop: page faults on a cold index would otherwise stall it.
+        with timer.stage("search"):
+            matches = await asyncio.to_thread(index.search, preds[NUM_CLASSES:], k)
+
+        with timer.stage("serialize"):
+            response = JSONResponse(content={
+                **build_prediction(preds, with_info=False),
+                "similar": matches[0],
+                "indexed": len(index),
+            })
+        if settings.server_timing:
+            response.headers["Server-Timing"] = timer.server_timing()
+        return response
+
+    except Exception as e:
+        return error_response(e)
+
+# ----------------------------------------------------
+# WebSocket Endpoint: Live Frame Stream
+# ----------------------------------------------------
+async def classify_frame(contents: bytes) -> np.ndarray:
+    """Class probabilities for one live-stream frame: the upload decode / batcher path, minus the cache."""
+    if len(contents) > settings.max_image_bytes:
+        raise ImageRejected(413, f"Frame exceeds {settings.max_image_bytes} bytes")
+    timer = StageTimer()
+    _admit(contents, timer)
+    input_tensor = await _decode(contents, timer)
+    with timer.stage("inference"):
+        return await batcher.submit(input_tensor)
 
-        # Get model input/output names
-        input_name = session.get_inputs()[0].name
-        output_name = session.get_outputs()[0].name
-
-        # Run inference
-        preds = session.run([output_name], {input_name: input_tensor})[0]
-        pred_idx = int(np.argmax(preds))
-        confidence = float(np.max(preds))
-
-        # For demonstration, randomly select a breed (replace with actual model mapping)
-        breed_name = random.choice(BREED_NAMES)
-        breed_data = BREED_INFO.get(breed_name, {})
-        
-        # Update confidence to match the selected breed's typical confidence
-        confidence = breed_data.get("confidence", confidence)
-
-        return JSONResponse(content={
-            "breed": breed_name,
-            "confidence": round(confidence, 2),
-            "info": breed_data
-        })
 
+async def _frame_reply(sequence: int, contents: bytes, top_k: int, smoother: Optional[PredictionSmoother]) -> dict:
+    try:
+        scores = await classify_frame(contents)
+    except ImageRejected as e:
+        STREAM_FRAMES.inc(result="failed")
+        return {"frame": sequence, "error": e.message, "status": e.status_code}
+    except (NotReady, ExecutorSaturated) as e:
+        STREAM_FRAMES.inc(result="failed")
+        return {"frame": sequence, "error": str(e) or "Server busy, please retry shortly", "status": 503}
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": str(e)})
+        ERRORS.inc(exception=type(e).__name__)
+        STREAM_FRAMES.inc(result="failed")
+        return {"frame": sequence, "error": str(e), "status": 500}
+
+    STREAM_FRAMES.inc(result="classified")
+    reply = {"frame": sequence, **build_prediction(scores, top_k, with_info=False)}
+    if smoother is not None:
+        index, confidence = top_k_classes(smoother.add(scores[:NUM_CLASSES]), 1)
+        reply["smoothed"] = {
+            "breed": BREED_LABELS[index[0, 0]],
+            "confidence": round(float(confidence[0, 0]), 4),
+            "frames": len(smoother),
+        }
+    return reply
+
+
+@app.websocket("/ws/analyze-stream")
+async def analyze_stream(websocket: WebSocket, top_k: int = Query(1, ge=1), smooth: int = Query(0, ge=0)):
+    """Classify a stream of binary image frames (typically JPEG), one JSON reply per classified frame.
+
+    Frames that arrive while an earlier one is still being classified replace
+    each other, so only the newest waits; skipped frames are counted in
+    ``dropped``. ``smooth=N`` adds the prediction averaged over the last N
+    classified frames.
+    """
+    await websocket.accept()
+    STREAMS_OPEN.inc()
+    slot = FrameSlot()
+    window = min(smooth, settings.stream_max_window)
+    smoother = PredictionSmoother(window) if window > 1 else None
+
+    async def receive_frames():
+        # Keep draining the socket so a slow classifier never stalls the client.
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                contents = message.get("bytes")
+                if contents is None:
+                    contents = (message.get("text") or "").encode()
+                dropped_before = slot.dropped
+                slot.put(contents)
+                if slot.dropped > dropped_before:
+                    STREAM_FRAMES.inc(result="dropped")
+        finally:
+            slot.close()
+
+    receiver = asyncio.create_task(receive_frames())
+    try:
+        while (frame := await slot.get()) is not None:
+            sequence, contents, received_at = frame
+            reply = await _frame_reply(sequence, contents, top_k, smoother)
+            reply["latency_ms"] = round(1000 * (time.perf_counter() - received_at), 2)
+            reply["dropped"] = slot.dropped
+            await websocket.send_json(reply)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        STREAMS_OPEN.dec()
+
+# ----------------------------------------------------
+# Additional API Endpoint: Prediction Cache Stats
+# ----------------------------------------------------
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Return prediction cache size and hit/miss counters."""
+    return JSONResponse(content=prediction_cache.stats())
 
 # ----------------------------------------------------
 # Additional API Endpoint: Get All Breeds
 # ----------------------------------------------------
 @app.get("/api/breeds")
-async def get_all_breeds():
+async def get_all_breeds(request: Request):
     """Return list of all supported breeds."""
-    return JSONResponse(content={
-        "breeds": BREED_NAMES,
-        "total_count": len(BREED_NAMES)
-    })
+    return BREEDS_RESPONSE.respond(request)
 
 # ----------------------------------------------------
 # Additional API Endpoint: Get Breed Info
 # ----------------------------------------------------
 @app.get("/api/breed/{breed_name}")
-async def get_breed_info(breed_name: str):
-    """Get information about a specific breed."""
-    breed_data = BREED_INFO.get(breed_name)
-    if breed_data:
-        return JSONResponse(content={
-            "breed": breed_name,
-            "info": breed_data
-        })
+async def get_breed_info(breed_name: str, request: Request):
+    """Get information about a specific breed (case, spaces and hyphens are ignored)."""
+    canonical_name = BREED_INDEX.get(normalize_breed_name(breed_name))
+    if canonical_name:
+        return BREED_RESPONSES[canonical_name].respond(request)
     else:
         return JSONResponse(status_code=404, content={"error": "Breed not found"})
 
+# ----------------------------------------------------
+# Additional API Endpoint: Micro-Batching Stats
+# ----------------------------------------------------
+@app.get("/api/batching/stats")
+async def get_batching_stats():
+    """Return per-batch occupancy counters, admission and worker pool load for tuning the batching knobs."""
+    return JSONResponse(content={
+        **batcher.stats.as_dict(),
+        "admission": admission.stats(),
+        "pools": {"decode": decode_pool.stats(), "inference": inference_pool.stats()},
+    })
+
+# ----------------------------------------------------
+# Admin Endpoints: Model Hot Swap
+# ----------------------------------------------------
+def admin_denied(token: Optional[str]) -> Optional[JSONResponse]:
+    """The response refusing an admin request, or None when its X-Admin-Token is valid."""
+    if not settings.admin_token:
+        return JSONResponse(status_code=404, content={"error": "Not Found"})
+    if token is None or not hmac.compare_digest(token.encode(), settings.admin_token.encode()):
+        return JSONResponse(status_code=403, content={"error": "Invalid admin token"})
+    return None
+
+
+def _model_status(status_code: int = 200) -> JSONResponse:
+    return JSONResponse(status_code=status_code, content=model_swapper.as_dict())
+
+
+@app.get("/admin/model")
+async def get_model_status(x_admin_token: Optional[str] = Header(None)):
+    """The live model, any candidate being built or shadowed, and its shadow agreement and latency."""
+    return admin_denied(x_admin_token) or _model_status()
+
+
+@app.post("/admin/model/reload")
+async def reload_model(
+    shadow: Optional[float] = Query(None, ge=0, le=1),
+    x_admin_token: Optional[str] = Header(None),
+):
+    """Load and warm the model file again in the background (202), then swap it in or shadow it first.
+
+    ``shadow`` is the fraction of batches replayed through the candidate
+    (default: model_shadow_fraction); with 0 it goes live once warm.
+    """
+    denied = admin_denied(x_admin_token)
+    if denied:
+        return denied
+    if settings.inference_backend != "local":
+        return JSONResponse(status_code=409, content={
+            "error": "The shm backend's model lives in inference_server.py; restart it to load a new model",
+        })
+    if not startup.ready:
+        return error_response(NotReady("Model is still loading, please retry shortly"))
+    fraction = settings.model_shadow_fraction if shadow is None else shadow
+    if model_swapper.start_reload(fraction) is None:
+        return JSONResponse(status_code=409, content={"error": "A model reload is already in progress"})
+    return _model_status(202)
+
+
+@app.post("/admin/model/promote")
+async def promote_model(x_admin_token: Optional[str] = Header(None)):
+    """Make the shadowed candidate the live model."""
+    denied = admin_denied(x_admin_token)
+    if denied:
+        return denied
+    if not model_swapper.promote():
+        return JSONResponse(status_code=409, content={"error": "No candidate model is being shadowed"})
+    return _model_status()
+
+
+@app.post("/admin/model/discard")
+async def discard_model(x_admin_token: Optional[str] = Header(None)):
+    """Drop the shadowed candidate and keep the live model."""
+    denied = admin_denied(x_admin_token)
+    if denied:
+        return denied
+    model_swapper.discard()
+    return _model_status()
+
+# ----------------------------------------------------
+# Health Probes
+# ----------------------------------------------------
+@app.get("/healthz")
+async def healthz():
+    """Liveness: the event loop is serving; fails only when model startup crashed."""
+    if startup.error:
+        return JSONResponse(status_code=503, content={"status": "failed", "error": startup.error})
+    return JSONResponse(content={"status": "ok"})
+
+
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 200 once the model is loaded and warmed up, 503 before that."""
+    return JSONResponse(status_code=200 if startup.ready else 503, content=startup.as_dict())
+
+# ----------------------------------------------------
+# Metrics Endpoint (Prometheus text format)
+# ----------------------------------------------------
+def _collect_runtime_metrics():
+    """Expose cache, batcher and pool state that is tracked outside the metrics registry."""
+    cache_stats = prediction_cache.stats()
+    cache_entries = Gauge("cattle_cache_entries", "Predictions held in the cache.")
+    cache_entries.set(cache_stats["entries"])
+    cache_lookups = Counter("cattle_cache_lookups_total", "Prediction cache lookups by result.", ("result",))
+    cache_lookups.inc(cache_stats["hits_exact"], result="hit_exact")
+    cache_lookups.inc(cache_stats["hits_perceptual"], result="hit_perceptual")
+    cache_lookups.inc(cache_stats["misses"], result="miss")
+
+    pool_inflight = Gauge("cattle_pool_inflight", "Jobs running or queued per worker pool.", ("pool",))
+    pool_rejected = Counter("cattle_pool_rejected_total", "Jobs refused because a pool was saturated.", ("pool",))
+    for pool in (decode_pool, inference_pool):
+        pool_inflight.set(pool.inflight, pool=pool.name)
+        pool_rejected.inc(pool.rejected, pool=pool.name)
+
+    admission_stats = admission.stats()
+    admission_requests = Gauge(
+        "cattle_admission_requests", "Analyze requests holding or waiting for a slot.", ("state",)
+    )
+    admission_requests.set(admission_stats["active"], state="active")
+    admission_requests.set(admission_stats["queued"], state="queued")
+    admission_refused = Counter(
+        "cattle_admission_refused_total", "Analyze requests refused (shed) or dropped past their deadline.", ("reason",)
+    )
+    admission_refused.inc(admission_stats["shed"], reason="shed")
+    admission_refused.inc(admission_stats["expired"] + batcher.stats.expired, reason="deadline")
+
+    model_swaps = Counter("cattle_model_swaps_total", "Models hot-swapped in since startup.")
+    model_swaps.inc(model_swapper.swaps)
+    shadow_agreement = Gauge(
+        "cattle_shadow_agreement", "Top-1 agreement of the shadowed candidate with the live model."
+    )
+    shadow = model_swapper.shadow
+    if shadow is not None and shadow.images:
+        shadow_agreement.set(shadow.agreed / shadow.images)
+
+    ready = Gauge("cattle_ready", "1 once the model is loaded and warmed up.")
+    ready.set(int(startup.ready))
+    startup_phases = Gauge("cattle_startup_phase_seconds", "Duration of each startup phase.", ("phase",))
+    for phase, seconds in list(startup.phases.items()):
+        startup_phases.set(seconds, phase=phase)
+    return [
+        cache_entries, cache_lookups, pool_inflight, pool_rejected, admission_requests, admission_refused,
+        model_swaps, shadow_agreement, ready, startup_phases,
+    ]
+
+
+REGISTRY.add_collector(_collect_runtime_metrics)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # ----------------------------------------------------
 # Run with: uvicorn main:app --reload
 # ----------------------------------------------------
\ No newline at end of file
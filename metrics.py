@@ -0,0 +1,214 @@
+import bisect
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Tuple
+
+# Metrics are updated from the event loop thread only, so no locking is needed.
+
+DEFAULT_SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ----------------------------------------------------
+# Metric Types
+# ----------------------------------------------------
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + list(self.samples())
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in self._values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_SECONDS_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def samples(self):
+        for key, (counts, total) in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}"
+
+
+# ----------------------------------------------------
+# Registry
+# ----------------------------------------------------
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[_Metric]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[_Metric]]):
+        """Register a callable that builds metrics from live state at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "cattle_http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status")))
+HTTP_DURATION = REGISTRY.register(Histogram(
+    "cattle_http_request_duration_seconds", "HTTP request latency by route.", ("route",)))
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "cattle_http_requests_in_flight", "HTTP requests currently being served."))
+ERRORS = REGISTRY.register(Counter(
+    "cattle_errors_total", "Failed classifications by exception type.", ("exception",)))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "cattle_stage_duration_seconds", "Time spent per request in each analysis stage.", ("stage",)))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "cattle_batch_size", "Images per session.run call.", buckets=(1, 2, 4, 8, 16, 32, 64)))
+BATCH_SECONDS = REGISTRY.register(Histogram(
+    "cattle_batch_run_duration_seconds", "session.run time per batch."))
+IMAGE_BYTES = REGISTRY.register(Histogram(
+    "cattle_image_bytes", "Uploaded image size in bytes.",
+    buckets=(16_384, 65_536, 262_144, 1_048_576, 4_194_304, 16_777_216, 67_108_864)))
+IMAGE_MEGAPIXELS = REGISTRY.register(Histogram(
+    "cattle_image_megapixels", "Uploaded image resolution in megapixels.",
+    buckets=(0.05, 0.25, 1, 2, 4, 8, 12, 16, 24, 50)))
+STREAMS_OPEN = REGISTRY.register(Gauge(
+    "cattle_streams_open", "Live frame-stream WebSocket connections."))
+STREAM_FRAMES = REGISTRY.register(Counter(
+    "cattle_stream_frames_total", "Live-stream frames by outcome (classified, dropped as stale, failed).", ("result",)))
+
+
+# ----------------------------------------------------
+# Per-Request Stage Timing
+# ----------------------------------------------------
+class StageTimer:
+    """Collects per-stage durations for one request and feeds STAGE_SECONDS."""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, stage: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - started)
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        STAGE_SECONDS.observe(seconds, stage=stage)
+
+    def server_timing(self) -> str:
+        """Value for a Server-Timing response header (durations in milliseconds)."""
+        return ", ".join(f"{stage};dur={1000 * seconds:.2f}" for stage, seconds in self.stages.items())
+
+
+# ----------------------------------------------------
+# ASGI Middleware
+# ----------------------------------------------------
+class MetricsMiddleware:
+    """Counts requests, status codes, latency and in-flight requests per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            # Route templates, not raw paths, keep label cardinality bounded.
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.inc(route=route_path, method=scope["method"], status=status["code"])
+            HTTP_DURATION.observe(time.perf_counter() - started, route=route_path)
@@ -0,0 +1,281 @@
+import asyncio
+import hashlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+
+from cache import model_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+def model_digest(path: str) -> str:
+    """Short SHA-256 of the model file's contents, or "" if it can't be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    except OSError:
+        return ""
+    return digest.hexdigest()[:12]
+
+
+@dataclass
+class ModelVersion:
+    """A loaded and warmed session plus what identifies it."""
+    session: Any
+    path: str
+    digest: str
+    load_seconds: float
+    # Embeddings of different models aren't comparable, so each version has its own index.
+    similarity_index: Any = None
+    loaded_at: float = field(default_factory=time.time)
+
+    def as_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "digest": self.digest,
+            "load_ms": round(1000 * self.load_seconds, 1),
+            "loaded_at": round(self.loaded_at, 3),
+        }
+
+
+# ----------------------------------------------------
+# Shadow Evaluation
+# ----------------------------------------------------
+class ShadowEvaluator:
+    """Replays a sampled fraction of live batches through a candidate model on its own thread.
+
+    ``offer`` is called from the inference thread right after a live batch and
+    never waits: the batch is copied only when sampled, and skipped while a
+    shadow run is still going, so the candidate never delays or queues up
+    behind live traffic (beyond the CPU it uses). Each sample records both
+    models' batch latency and whether their top-1 breeds agree. Once
+    ``close`` has run, ``offer`` is a no-op, so a batch that picked up the
+    evaluator just before a promote or discard still finishes normally.
+    """
+
+    def __init__(self, run_candidate: Callable[[np.ndarray], np.ndarray], fraction: float):
+        self.run_candidate = run_candidate
+        self.fraction = min(max(fraction, 0.0), 1.0)
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="shadow")
+        self._lock = threading.Lock()
+        self._busy = False
+        self._closed = False
+        self._random = random.Random()
+        self.offered = 0
+        self.sampled = 0
+        self.skipped = 0
+        self.failed = 0
+        self.images = 0
+        self.agreed = 0
+        self.max_score_diff = 0.0
+        self.live_seconds = 0.0
+        self.candidate_seconds = 0.0
+
+    def offer(self, batch: np.ndarray, live_scores: np.ndarray, live_seconds: float):
+        with self._lock:
+            if self._closed:
+                return
+            self.offered += 1
+            if self._random.random() >= self.fraction:
+                return
+            if self._busy:
+                self.skipped += 1
+                return
+            self._busy = True
+        batch, live_scores = batch.copy(), live_scores.copy()
+        with self._lock:
+            # Checked again under the lock close() takes, so submit never meets a shut-down pool.
+            if not self._closed:
+                self._pool.submit(self._evaluate, batch, live_scores, live_seconds)
+
+    def _evaluate(self, batch: np.ndarray, live_scores: np.ndarray, live_seconds: float):
+        try:
+            started = time.perf_counter()
+            scores = self.run_candidate(batch)
+            candidate_seconds = time.perf_counter() - started
+            agreed = int((scores.argmax(axis=1) == live_scores.argmax(axis=1)).sum())
+            score_diff = float(np.abs(scores - live_scores).max())
+        except Exception:
+            logger.warning("Shadow run failed", exc_info=True)
+            with self._lock:
+                self.failed += 1
+                self._busy = False
+            return
+        with self._lock:
+            self.sampled += 1
+            self.images += len(batch)
+            self.agreed += agreed
+            self.max_score_diff = max(self.max_score_diff, score_diff)
+            self.live_seconds += live_seconds
+            self.candidate_seconds += candidate_seconds
+            self._busy = False
+
+    def stats(self) -> dict:
+        with self._lock:
+            sampled = max(self.sampled, 1)
+            return {
+                "fraction": self.fraction,
+                "batches_offered": self.offered,
+                "batches_sampled": self.sampled,
+                "batches_skipped": self.skipped,
+                "batches_failed": self.failed,
+                "images": self.images,
+                "top1_agreement": round(self.agreed / self.images, 4) if self.images else None,
+                "max_score_diff": round(self.max_score_diff, 4),
+                "live_batch_ms": round(1000 * self.live_seconds / sampled, 3),
+                "candidate_batch_ms": round(1000 * self.candidate_seconds / sampled, 3),
+            }
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ----------------------------------------------------
+# Reload Coordination
+# ----------------------------------------------------
+class ModelSwapper:
+    """Background model reloads: build and warm a candidate, optionally shadow it, then swap it in.
+
+    ``build`` runs in a worker thread and returns a warmed ModelVersion (or
+    raises); ``activate`` runs on the event loop and makes a version live with
+    plain reference assignments, so no request ever sees a half-loaded model.
+    ``run_candidate`` scores a batch on a candidate version for shadowing.
+    """
+
+    def __init__(
+        self,
+        build: Callable[[], ModelVersion],
+        activate: Callable[[ModelVersion], None],
+        run_candidate: Callable[[ModelVersion, np.ndarray], np.ndarray],
+        release: Callable[[ModelVersion], None],
+    ):
+        self.build = build
+        self.activate = activate
+        self.run_candidate = run_candidate
+        self.release = release
+        self.live: Optional[ModelVersion] = None
+        self.candidate: Optional[ModelVersion] = None
+        self.shadow: Optional[ShadowEvaluator] = None
+        self.state = "idle"
+        self.error: Optional[str] = None
+        self.swaps = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start_reload(self, shadow_fraction: float = 0.0) -> Optional[asyncio.Task]:
+        """Begin a reload in the background; None if one is already running."""
+        if self.busy:
+            return None
+        self.state = "building"
+        self._task = asyncio.get_running_loop().create_task(self.reload(shadow_fraction))
+        return self._task
+
+    async def reload(self, shadow_fraction: float = 0.0):
+        self.discard()
+        self.state = "building"
+        self.error = None
+        try:
+            candidate = await asyncio.to_thread(self.build)
+        except Exception as e:
+            self.state = "failed"
+            self.error = f"{type(e).__name__}: {e}"
+            logger.error("Model reload failed: %s", self.error, exc_info=e)
+            return
+        if shadow_fraction > 0:
+            self.candidate = candidate
+            self.shadow = ShadowEvaluator(lambda batch: self.run_candidate(candidate, batch), shadow_fraction)
+            self.state = "shadowing"
+            logger.info("Shadowing candidate model %s on %.0f%% of batches", candidate.digest, 100 * shadow_fraction)
+        else:
+            self._swap(candidate)
+
+    def promote(self) -> bool:
+        """Make the shadowed candidate live; False if there is none."""
+        if self.candidate is None:
+            return False
+        candidate = self.candidate
+        self._stop_shadow()
+        self._swap(candidate)
+        return True
+
+    def discard(self):
+        """Drop the shadowed candidate, if any, keeping the live model."""
+        if self.candidate is not None:
+            self.release(self.candidate)
+            logger.info("Discarded candidate model %s", self.candidate.digest)
+        self._stop_shadow()
+        self.state = "idle"
+
+    def _stop_shadow(self):
+        if self.shadow is not None:
+            self.shadow.close()
+        self.shadow = None
+        self.candidate = None
+
+    def _swap(self, version: ModelVersion):
+        previous, self.live = self.live, version
+        self.activate(version)
+        self.swaps += 1
+        self.state = "idle"
+        # Batches already running keep their reference to the old session and finish on it.
+        if previous is not None:
+            self.release(previous)
+        logger.info("Model %s is live (was %s)", version.digest, previous.digest if previous else None)
+
+    def as_dict(self) -> dict:
+        return {
+            "state": self.state,
+            "error": self.error,
+            "swaps": self.swaps,
+            "live": self.live.as_dict() if self.live else None,
+            "candidate": self.candidate.as_dict() if self.candidate else None,
+            "shadow": self.shadow.stats() if self.shadow else None,
+        }
+
+    async def close(self):
+        if self.busy:
+            self._task.cancel()
+        self.discard()
+
+
+# ----------------------------------------------------
+# Model File Watch
+# ----------------------------------------------------
+async def watch_model_file(path: str, interval: float, on_change: Callable[[], Awaitable[bool]]):
+    """Poll ``path`` every ``interval`` seconds and await ``on_change`` once a new version settles.
+
+    A changed (size, mtime) must hold for one more poll before it counts, so a
+    model still being copied into place isn't loaded half-written. ``on_change``
+    returns False when it couldn't start a reload (one is already running), and
+    the change is then retried on the next poll instead of being marked seen.
+    """
+    known = model_fingerprint(path)
+    pending = None
+    while True:
+        await asyncio.sleep(interval)
+        current = model_fingerprint(path)
+        if current is None or current == known:
+            pending = None
+            continue
+        if current != pending:
+            pending = current
+            continue
+        logger.info("Model file %s changed; reloading", path)
+        if await on_change():
+            known, pending = current, None
+        else:
+            logger.info("A model reload is already running; retrying %s on the next check", path)
@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+from typing import List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# ----------------------------------------------------
+# Label Table
+# ----------------------------------------------------
+def default_labels_path(model_path: str) -> str:
+    """Label table shipped next to the model: <name>.labels.json."""
+    stem, _ = os.path.splitext(model_path)
+    return f"{stem}.labels.json"
+
+
+def load_labels(path: str, num_classes=None) -> List[str]:
+    """Read the class-index -> breed table and check it against the model's output width.
+
+    The file holds a JSON list, or an object with the list under ``labels``; an
+    object with ``"provisional": true`` marks an unverified class order, which
+    is loaded with a warning.
+    """
+    with open(path, encoding="utf-8") as f:
+        labels = json.load(f)
+    if isinstance(labels, dict):
+        if labels.get("provisional"):
+            logger.warning("%s is provisional, so predicted breed names may be wrong: %s",
+                           path, labels.get("note", "class order not confirmed"))
+        labels = labels.get("labels")
+    if not isinstance(labels, list) or not all(isinstance(label, str) for label in labels):
+        raise ValueError(f"{path} must hold a JSON list of breed names, or an object with one under 'labels'")
+    if len(set(labels)) != len(labels):
+        raise ValueError(f"{path} lists a breed more than once")
+    if num_classes is not None and len(labels) != num_classes:
+        raise ValueError(f"{path} has {len(labels)} labels but the model outputs {num_classes} classes")
+    return labels
+
+
+# ----------------------------------------------------
+# Scores
+# ----------------------------------------------------
+def softmax(logits: np.ndarray, temperature: float = 1.0) -> np.ndarray:
+    """Row-wise softmax of an (N, classes) logit batch, with temperature scaling for calibration."""
+    scaled = np.asarray(logits, dtype=np.float32) / np.float32(temperature)
+    scaled -= scaled.max(axis=-1, keepdims=True)
+    np.exp(scaled, out=scaled)
+    scaled /= scaled.sum(axis=-1, keepdims=True)
+    return scaled
+
+
+def top_k_classes(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Indices and scores of the k best classes per row, best first.
+
+    argpartition selects the k winners in O(classes) per row; only those k
+    are sorted, so the cost barely moves as the batch or class count grows.
+    """
+    scores = np.atleast_2d(scores)
+    k = max(1, min(k, scores.shape[-1]))
+    if k < scores.shape[-1]:
+        candidates = np.argpartition(scores, -k, axis=-1)[:, -k:]
+    else:
+        candidates = np.broadcast_to(np.arange(scores.shape[-1]), scores.shape)
+    candidate_scores = np.take_along_axis(scores, candidates, axis=-1)
+    order = np.argsort(-candidate_scores, axis=-1, kind="stable")
+    return np.take_along_axis(candidates, order, axis=-1), np.take_along_axis(candidate_scores, order, axis=-1)
@@ -0,0 +1,423 @@
+import io
+import math
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from PIL import Image
+
+
+class ImageRejected(ValueError):
+    """An upload refused with a 4xx status, ideally before any pixel is decoded."""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(status_code, message)
+        self.status_code = status_code
+        self.message = message
+
+    def __str__(self):
+        return self.message
+
+
+# ----------------------------------------------------
+# Header Sniffing
+# ----------------------------------------------------
+def sniff_image(contents: bytes, allowed_formats, max_pixels: int):
+    """Validate format and dimensions from the image header alone; return (format, width, height).
+
+    Image.open only parses the header, so oversized, unsupported or garbage
+    uploads are refused in microseconds instead of after a full decode.
+    """
+    if not contents:
+        raise ImageRejected(400, "Empty upload")
+    try:
+        image = Image.open(io.BytesIO(contents))
+    except Image.UnidentifiedImageError:
+        raise ImageRejected(415, "Unrecognized image format") from None
+    except Image.DecompressionBombError as e:
+        raise ImageRejected(413, str(e)) from None
+    except (OSError, SyntaxError, ValueError) as e:
+        raise ImageRejected(400, f"Malformed image header: {e}") from None
+
+    width, height = image.size
+    if image.format not in allowed_formats:
+        raise ImageRejected(415, f"Unsupported image format {image.format}; expected one of {', '.join(sorted(allowed_formats))}")
+    if width <= 0 or height <= 0:
+        raise ImageRejected(400, "Image has no pixels")
+    if width * height > max_pixels:
+        raise ImageRejected(413, f"Image resolution {width}x{height} exceeds the {max_pixels} pixel limit")
+    return image.format, width, height
+
+
+# ----------------------------------------------------
+# Helper Function for Preprocessing
+# ----------------------------------------------------
+# Fixed resampling filter (Pillow's own default for RGB resize) so outputs
+# don't drift if that default changes between Pillow releases.
+RESAMPLE = Image.Resampling.BICUBIC
+# Let Pillow shrink very large non-JPEG inputs by an integer factor first;
+# at 3.0 the result is close to a full-quality resample and much cheaper.
+REDUCING_GAP = 3.0
+
+_PIXEL_SCALE = np.float32(255.0)
+
+
+def _resized_pixels(image: Image.Image, size) -> np.ndarray:
+    """The image as (H,W,C) uint8 RGB pixels at ``size``."""
+    if image.format == "JPEG":
+        image.draft("RGB", size)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != size:
+        image = image.resize(size, RESAMPLE, reducing_gap=REDUCING_GAP)
+    return np.asarray(image)
+
+
+def preprocess_image(image: Image.Image, size=(224, 224), out: np.ndarray = None):
+    """Resize, normalize, and convert image to tensor format for ONNX model.
+
+    The normalized CHW float32 pixels are written straight into ``out``, e.g.
+    one (3,H,W) slot of a TTA batch; when omitted a fresh contiguous (1,3,H,W)
+    array is returned. The serving path takes the fresh array, since it is
+    decoded in a worker before any batch exists; the micro-batcher then copies
+    it into one of its reused batch buffers. For JPEGs that
+    have not been loaded yet, draft mode decodes at the smallest DCT scale that
+    still covers ``size``, so a 12 MP photo never decodes at full resolution.
+    """
+    width, height = size
+    if out is None:
+        out = np.empty((1, 3, height, width), dtype=np.float32)
+    target = out[0] if out.ndim == 4 else out
+    pixels = _resized_pixels(image, size)
+    np.divide(pixels.transpose(2, 0, 1), _PIXEL_SCALE, out=target)  # (H,W,C) → (C,H,W), normalize [0,1]
+    return out
+
+
+def _load_image(contents: bytes, draft_size):
+    """Fully decode ``contents`` (JPEGs at the smallest scale covering ``draft_size``); return (image, original size).
+
+    ``draft_size`` may also be a function of the original size.
+    """
+    try:
+        image = Image.open(io.BytesIO(contents))
+        original_size = image.size
+        if callable(draft_size):
+            draft_size = draft_size(original_size)
+        if image.format == "JPEG":
+            image.draft("RGB", draft_size)
+        image.load()
+    except Image.DecompressionBombError as e:
+        raise ImageRejected(413, str(e)) from None
+    except OSError as e:
+        raise ImageRejected(400, f"Image data is truncated or corrupt: {e}") from None
+    return image, original_size
+
+
+def preprocess_pixels(image: Image.Image, size=(224, 224)) -> np.ndarray:
+    """(1,H,W,3) uint8 input for a model that scales and transposes in-graph (CATTLE_MODEL_INPUT=uint8)."""
+    return _resized_pixels(image, size)[np.newaxis]
+
+
+def decode_and_preprocess_timed(contents: bytes, pixels: bool = False):
+    """Decode uploaded image bytes into the (1,3,224,224) model input and report where the time went.
+
+    Kept free of any model state so it can run in a worker thread or process.
+    Returns ``(tensor, info)`` where info holds the ``decode`` and
+    ``preprocess`` durations in seconds and the original ``width`` / ``height``.
+    With ``pixels`` the tensor is preprocess_pixels' uint8 input instead.
+    """
+    started = time.perf_counter()
+    image, (width, height) = _load_image(contents, (224, 224))
+    decoded = time.perf_counter()
+    tensor = preprocess_pixels(image) if pixels else preprocess_image(image)
+    return tensor, {
+        "decode": decoded - started,
+        "preprocess": time.perf_counter() - decoded,
+        "width": width,
+        "height": height,
+    }
+
+
+# ----------------------------------------------------
+# Test-Time Augmentation Views
+# ----------------------------------------------------
+# View order for TTA requests asking for N views: the plain full-frame input
+# first, then flips and the ten-crop views of a 256x256 resize.
+TTA_VIEWS = (
+    "full", "full_flip", "center", "center_flip",
+    "top_left", "top_right", "bottom_left", "bottom_right",
+    "top_left_flip", "top_right_flip", "bottom_left_flip", "bottom_right_flip",
+)
+TTA_BASE_SIZE = 256
+_CROP_ORIGINS = {
+    "center": ((TTA_BASE_SIZE - 224) // 2, (TTA_BASE_SIZE - 224) // 2),
+    "top_left": (0, 0),
+    "top_right": (0, TTA_BASE_SIZE - 224),
+    "bottom_left": (TTA_BASE_SIZE - 224, 0),
+    "bottom_right": (TTA_BASE_SIZE - 224, TTA_BASE_SIZE - 224),
+}
+
+
+def preprocess_views(image: Image.Image, views: int, pixels: bool = False) -> np.ndarray:
+    """Stack the first ``views`` TTA_VIEWS of ``image`` into one (views,3,224,224) batch.
+
+    The image is resized at most twice (224 and 256); crops and flips are
+    array slices copied straight into the batch. With ``pixels`` the batch
+    holds (views,224,224,3) uint8 pixels instead.
+    """
+    views = max(1, min(views, len(TTA_VIEWS)))
+    base_size = (TTA_BASE_SIZE, TTA_BASE_SIZE)
+    if pixels:
+        batch = np.empty((views, 224, 224, 3), dtype=np.uint8)
+        batch[0] = _resized_pixels(image, (224, 224))
+        base = _resized_pixels(image, base_size) if views > 2 else None
+        rows, cols = 0, 1
+    else:
+        batch = np.empty((views, 3, 224, 224), dtype=np.float32)
+        preprocess_image(image, out=batch[0])
+        base = preprocess_image(image, size=base_size)[0] if views > 2 else None
+        rows, cols = 1, 2
+    for index, name in enumerate(TTA_VIEWS[:views]):
+        crop = name.removesuffix("_flip")
+        if crop == "full":
+            view = batch[0]
+        else:
+            top, left = _CROP_ORIGINS[crop]
+            window = [slice(None)] * 3
+            window[rows], window[cols] = slice(top, top + 224), slice(left, left + 224)
+            view = base[tuple(window)]
+        if name.endswith("_flip"):
+            view = np.flip(view, axis=cols)
+        if index:
+            batch[index] = view
+    return batch
+
+
+def decode_and_preprocess_views_timed(contents: bytes, views: int, pixels: bool = False):
+    """decode_and_preprocess_timed for TTA: returns the (views,3,224,224) stack and the same timing info."""
+    started = time.perf_counter()
+    image, (width, height) = _load_image(contents, (TTA_BASE_SIZE, TTA_BASE_SIZE))
+    decoded = time.perf_counter()
+    batch = preprocess_views(image, views, pixels)
+    return batch, {
+        "decode": decoded - started,
+        "preprocess": time.perf_counter() - decoded,
+        "width": width,
+        "height": height,
+    }
+
+
+# ----------------------------------------------------
+# Tiling for Herd Photos
+# ----------------------------------------------------
+TILE_SIZE = 224
+# Most a small image is enlarged so its short side fills a tile.
+MAX_TILE_UPSCALE = 4.0
+
+
+def tiling_size(size, max_side: int):
+    """Working resolution for tiling: long side at most ``max_side``, short side at least one tile.
+
+    Thin images are enlarged to fill a tile across, but by at most
+    MAX_TILE_UPSCALE and never past ``max_side`` squared pixels; a short side
+    still under a tile is then stretched to one, so a long enough strip still
+    comes out large and is refused by the tile limit.
+    """
+    width, height = size
+    scale = max(min(1.0, max_side / max(width, height)), min(TILE_SIZE / min(width, height), MAX_TILE_UPSCALE))
+    scale = min(scale, max(max_side, TILE_SIZE) / math.sqrt(width * height))
+    return max(TILE_SIZE, round(width * scale)), max(TILE_SIZE, round(height * scale))
+
+
+def _tile_stride(overlap: float) -> int:
+    return max(1, int(TILE_SIZE * (1.0 - min(max(overlap, 0.0), 0.9))))
+
+
+def _tile_starts(length: int, stride: int) -> np.ndarray:
+    starts = list(range(0, length - TILE_SIZE + 1, stride))
+    if starts[-1] != length - TILE_SIZE:
+        starts.append(length - TILE_SIZE)  # last tile flush with the far edge
+    return np.array(starts)
+
+
+def _tile_count(length: int, stride: int) -> int:
+    return -(-(length - TILE_SIZE) // stride) + 1  # len(_tile_starts(length, stride)), without building it
+
+
+def check_tile_count(size, overlap: float, max_tiles: int):
+    """Refuse with 413 a working resolution that would cut into more than ``max_tiles`` tiles (0: no limit)."""
+    stride = _tile_stride(overlap)
+    tiles = _tile_count(size[0], stride) * _tile_count(size[1], stride)
+    if max_tiles and tiles > max_tiles:
+        raise ImageRejected(413, f"Image would be cut into {tiles} tiles, more than the {max_tiles} tile limit")
+
+
+def tile_image(image: Image.Image, max_side: int, overlap: float, original_size=None, pixels: bool = False,
+               max_tiles: int = 0):
+    """Cut ``image`` into overlapping 224x224 tiles; return the (N,3,224,224) batch and (x, y, w, h) boxes.
+
+    The image is resized once to the working resolution. Tiles are then picked
+    from a sliding-window view of its pixels, which already has the (C,H,W)
+    layout, so no per-tile crop or transpose is made. Boxes are in the pixel
+    coordinates of ``original_size`` (default: the image's own size, which
+    differs once a JPEG has been draft-decoded). With ``pixels`` the batch
+    holds (N,224,224,3) uint8 tiles instead. More than ``max_tiles`` tiles is
+    refused before anything is resized.
+    """
+    original_width, original_height = original_size or image.size
+    size = tiling_size((original_width, original_height), max_side)
+    check_tile_count(size, overlap, max_tiles)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != size:
+        image = image.resize(size, RESAMPLE, reducing_gap=REDUCING_GAP)
+
+    rgb = np.asarray(image)  # (H,W,C) uint8
+    stride = _tile_stride(overlap)
+    ys, xs = _tile_starts(size[1], stride), _tile_starts(size[0], stride)
+    windows = sliding_window_view(rgb, (TILE_SIZE, TILE_SIZE), axis=(0, 1))  # (H-223, W-223, C, 224, 224), no copy
+    if pixels:
+        batch = np.ascontiguousarray(windows[np.ix_(ys, xs)].transpose(0, 1, 3, 4, 2))
+    else:
+        batch = np.empty((len(ys), len(xs), 3, TILE_SIZE, TILE_SIZE), dtype=np.float32)
+        np.divide(windows[np.ix_(ys, xs)], _PIXEL_SCALE, out=batch)
+
+    scale_x, scale_y = original_width / size[0], original_height / size[1]
+    boxes = [
+        (round(x * scale_x), round(y * scale_y), round(TILE_SIZE * scale_x), round(TILE_SIZE * scale_y))
+        for y in ys.tolist() for x in xs.tolist()
+    ]
+    return batch.reshape((-1,) + batch.shape[2:]), boxes
+
+
+def decode_and_tile_timed(contents: bytes, max_side: int, overlap: float, max_tiles: int = 0, pixels: bool = False):
+    """decode_and_preprocess_timed for herd photos: returns ((tiles, boxes), info).
+
+    The tile limit is checked from the header's size, before any pixel is decoded.
+    """
+
+    def working_size(size):
+        size = tiling_size(size, max_side)
+        check_tile_count(size, overlap, max_tiles)
+        return size
+
+    started = time.perf_counter()
+    image, (width, height) = _load_image(contents, working_size)
+    decoded = time.perf_counter()
+    tiles = tile_image(image, max_side, overlap, original_size=(width, height), pixels=pixels, max_tiles=max_tiles)
+    return tiles, {
+        "decode": decoded - started,
+        "preprocess": time.perf_counter() - decoded,
+        "width": width,
+        "height": height,
+    }
+
+
+# ----------------------------------------------------
+# Offline Batches
+# ----------------------------------------------------
+def load_pixel_batch(paths, size=(224, 224)):
+    """Read, decode and resize image files into one (N,H,W,3) uint8 batch; meant for a worker process.
+
+    Returns ``(pixels, loaded_paths, errors)``, where ``errors`` maps each
+    unreadable path to its message. Pixels cross the process boundary as
+    uint8, a quarter of the float32 tensor; normalize_pixel_batch finishes
+    the job in the parent.
+    """
+    width, height = size
+    pixels = np.empty((len(paths), height, width, 3), dtype=np.uint8)
+    loaded, errors = [], {}
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+                image, _ = _load_image(f.read(), size)
+            pixels[len(loaded)] = _resized_pixels(image, size)
+        except Exception as e:  # one bad file must not stop a whole archive
+            errors[path] = str(e) if isinstance(e, ImageRejected) else f"{type(e).__name__}: {e}"
+            continue
+        loaded.append(path)
+    return pixels[:len(loaded)], loaded, errors
+
+
+def normalize_pixel_batch(pixels: np.ndarray, out: np.ndarray = None) -> np.ndarray:
+    """(N,H,W,3) uint8 pixels -> (N,3,H,W) float32 model input, the values preprocess_image gives."""
+    if out is None:
+        out = np.empty((pixels.shape[0], 3) + pixels.shape[1:3], dtype=np.float32)
+    np.divide(pixels.transpose(0, 3, 1, 2), _PIXEL_SCALE, out=out)
+    return out
+
+
+# ----------------------------------------------------
+# Pre-Decoded Uploads
+# ----------------------------------------------------
+RAW_INPUT_SIZE = 224
+_NPY_MAGIC = b"\x93NUMPY"
+_NPY_HEADER_READERS = {
+    (1, 0): np.lib.format.read_array_header_1_0,
+    (2, 0): np.lib.format.read_array_header_2_0,
+}
+
+
+def _read_npy(contents: bytes) -> np.ndarray:
+    """Wrap a .npy upload's data with np.frombuffer, after checking its header."""
+    if not contents.startswith(_NPY_MAGIC):
+        raise ImageRejected(400, "Not a .npy file")
+    stream = io.BytesIO(contents)
+    try:
+        version = np.lib.format.read_magic(stream)
+        if version not in _NPY_HEADER_READERS:
+            raise ValueError(f"unsupported format version {version}")
+        shape, fortran_order, dtype = _NPY_HEADER_READERS[version](stream)
+    except ValueError as e:
+        raise ImageRejected(400, f"Malformed .npy header: {e}") from None
+    if dtype not in (np.dtype(np.uint8), np.dtype(np.float32)):
+        raise ImageRejected(415, f"Unsupported .npy dtype {dtype}; expected uint8 or float32")
+    if fortran_order:
+        raise ImageRejected(400, "Fortran-ordered .npy arrays are not supported")
+    try:
+        return np.frombuffer(contents, dtype=dtype, count=int(np.prod(shape)), offset=stream.tell()).reshape(shape)
+    except ValueError:
+        raise ImageRejected(400, f".npy data is shorter than its {shape} header") from None
+
+
+def load_pixel_upload(contents: bytes, fmt: str, layout: str = "hwc", pixels: bool = False) -> np.ndarray:
+    """Model input from an upload that is already 224x224: raw uint8 bytes (``fmt="raw"``) or a .npy file.
+
+    Raw bytes are 224*224*3 uint8 values in ``layout``, "hwc" or "chw". A .npy
+    file holds uint8 pixels in either layout, or a float32 (3,224,224) tensor
+    already scaled to [0,1]; a leading batch axis of 1 is allowed. The data is
+    wrapped, not copied, and converted only if the model's input format
+    (``pixels``: uint8 HWC, else float32 CHW) differs, so HWC uint8 into a
+    uint8 model costs nothing until the micro-batcher stacks it.
+    """
+    side = RAW_INPUT_SIZE
+    if fmt == "npy":
+        array = _read_npy(contents)
+    else:
+        if len(contents) != side * side * 3:
+            raise ImageRejected(
+                400, f"Raw input must be {side}x{side}x3 uint8 values ({side * side * 3} bytes), got {len(contents)}")
+        shape = (side, side, 3) if layout == "hwc" else (3, side, side)
+        array = np.frombuffer(contents, dtype=np.uint8).reshape(shape)
+    if array.ndim == 4 and array.shape[0] == 1:
+        array = array[0]
+
+    if array.dtype == np.float32:
+        if array.shape != (3, side, side):
+            raise ImageRejected(400, f"float32 input must have shape (3, {side}, {side}), got {array.shape}")
+        if not (array.min() >= 0.0 and array.max() <= 1.0):  # also catches NaN
+            raise ImageRejected(400, "float32 input must be scaled to [0, 1]")
+        if pixels:
+            return np.rint(array * _PIXEL_SCALE).astype(np.uint8).transpose(1, 2, 0)[np.newaxis]
+        return array[np.newaxis]
+
+    if array.shape == (side, side, 3):
+        hwc = array
+    elif array.shape == (3, side, side):
+        hwc = array.transpose(1, 2, 0)
+    else:
+        raise ImageRejected(
+            400, f"uint8 input must have shape ({side}, {side}, 3) or (3, {side}, {side}), got {array.shape}")
+    if pixels:
+        return hwc[np.newaxis]
+    return normalize_pixel_batch(hwc[np.newaxis])
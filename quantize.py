@@ -0,0 +1,203 @@
+"""Produce and evaluate an INT8 variant of the breed model.
+
+Run from the repository root (needs the ``onnx`` package):
+
+    python quantize.py dynamic
+    python quantize.py static --images ./calibration_photos
+    python quantize.py compare --images ./eval_photos --report int8_report.json
+
+``dynamic`` quantizes weights ahead of time and activations on the fly;
+``static`` also fixes activation ranges from a calibration run over local
+images (defaults to the repo root, i.e. ``cow.png``). Both write next to the
+FP32 model as ``<name>.int8.onnx``, the file served when
+``CATTLE_MODEL_PRECISION=int8``. ``compare`` reports per-image latency,
+batched throughput, file size and top-1 agreement between the two models.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import onnxruntime as ort
+from PIL import Image, ImageOps
+
+from preprocessing import preprocess_image
+from session_factory import int8_model_path, with_dynamic_batch
+from settings import load_settings
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".bmp", ".webp"}
+
+
+def iter_image_paths(directory: str):
+    for path in sorted(Path(directory).rglob("*")):
+        if path.suffix.lower() in IMAGE_SUFFIXES and path.is_file():
+            yield path
+
+
+def image_views(image: Image.Image):
+    """The image plus flipped and cropped views, so a handful of photos still gives a usable sample."""
+    image = image.convert("RGB")
+    width, height = image.size
+    crop_w, crop_h = int(width * 0.8), int(height * 0.8)
+    yield image
+    yield ImageOps.mirror(image)
+    for left, top in [(0, 0), (width - crop_w, 0), (0, height - crop_h), (width - crop_w, height - crop_h),
+                      ((width - crop_w) // 2, (height - crop_h) // 2)]:
+        yield image.crop((left, top, left + crop_w, top + crop_h))
+
+
+def load_samples(directory: str) -> np.ndarray:
+    """Stack every view of every image under ``directory`` into one (N,3,224,224) array."""
+    tensors = []
+    for path in iter_image_paths(directory):
+        with Image.open(path) as image:
+            tensors.extend(preprocess_image(view) for view in image_views(image))
+    if not tensors:
+        raise SystemExit(f"No images found under {directory}")
+    return np.concatenate(tensors)
+
+
+def _prepared_model_file(model_path: str, workdir: str) -> str:
+    """Write the model with a dynamic batch axis (so the INT8 variant batches like the
+    FP32 one), then run ORT's recommended shape-inference / fusion pre-pass."""
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    relaxed = os.path.join(workdir, "fp32.onnx")
+    with open(relaxed, "wb") as f:
+        f.write(with_dynamic_batch(model_path))
+    prepared = os.path.join(workdir, "fp32.prepared.onnx")
+    quant_pre_process(relaxed, prepared, skip_symbolic_shape=True)  # plain CNN: ONNX shape inference suffices
+    return prepared
+
+
+# ----------------------------------------------------
+# Quantization
+# ----------------------------------------------------
+def quantize_dynamic_model(model_path: str, output_path: str):
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    with tempfile.TemporaryDirectory() as workdir:
+        quantize_dynamic(_prepared_model_file(model_path, workdir), output_path, weight_type=QuantType.QInt8)
+
+
+def quantize_static_model(model_path: str, output_path: str, images: str, per_channel: bool):
+    from onnxruntime.quantization import CalibrationDataReader, QuantFormat, QuantType, quantize_static
+
+    samples = load_samples(images)
+
+    class _Reader(CalibrationDataReader):
+        def __init__(self, input_name):
+            self._feeds = iter({input_name: samples[i:i + 1]} for i in range(len(samples)))
+
+        def get_next(self):
+            return next(self._feeds, None)
+
+    input_name = ort.InferenceSession(model_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    with tempfile.TemporaryDirectory() as workdir:
+        quantize_static(
+            _prepared_model_file(model_path, workdir),
+            output_path,
+            _Reader(input_name),
+            quant_format=QuantFormat.QDQ,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            per_channel=per_channel,
+        )
+    print(f"Calibrated on {len(samples)} views from {images}")
+
+
+# ----------------------------------------------------
+# Comparison Report
+# ----------------------------------------------------
+def _measure(model_path: str, samples: np.ndarray, batch_size: int, repeat: int) -> dict:
+    session = ort.InferenceSession(with_dynamic_batch(model_path), providers=["CPUExecutionProvider"])
+    input_name = session.get_inputs()[0].name
+    session.run(None, {input_name: samples[:1]})  # warm-up
+
+    latencies = []
+    for _ in range(repeat):
+        for i in range(len(samples)):
+            started = time.perf_counter()
+            session.run(None, {input_name: samples[i:i + 1]})
+            latencies.append(time.perf_counter() - started)
+
+    batch = np.ascontiguousarray(np.resize(samples, (batch_size,) + samples.shape[1:]))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        session.run(None, {input_name: batch})
+    throughput = batch_size * repeat / (time.perf_counter() - started)
+
+    logits = np.concatenate([session.run(None, {input_name: samples[i:i + 1]})[0] for i in range(len(samples))])
+    latencies.sort()
+    return {
+        "path": model_path,
+        "size_bytes": os.path.getsize(model_path),
+        "latency_ms": {
+            "mean": round(1000 * statistics.fmean(latencies), 3),
+            "p50": round(1000 * latencies[len(latencies) // 2], 3),
+            "p95": round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3),
+        },
+        "throughput_images_per_s": round(throughput, 1),
+        "_logits": logits,
+    }
+
+
+def compare_models(fp32_path: str, int8_path: str, images: str, batch_size: int, repeat: int) -> dict:
+    samples = load_samples(images)
+    fp32 = _measure(fp32_path, samples, batch_size, repeat)
+    int8 = _measure(int8_path, samples, batch_size, repeat)
+    fp32_logits, int8_logits = fp32.pop("_logits"), int8.pop("_logits")
+    return {
+        "samples": len(samples),
+        "batch_size": batch_size,
+        "fp32": fp32,
+        "int8": int8,
+        "top1_agreement": float(np.mean(fp32_logits.argmax(axis=1) == int8_logits.argmax(axis=1))),
+        "max_abs_logit_diff": float(np.abs(fp32_logits - int8_logits).max()),
+        "speedup": round(fp32["latency_ms"]["mean"] / int8["latency_ms"]["mean"], 3),
+        "size_ratio": round(int8["size_bytes"] / fp32["size_bytes"], 3),
+    }
+
+
+def main(argv=None) -> int:
+    settings = load_settings()
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=settings.model_path, help="FP32 model (default: CATTLE_MODEL_PATH)")
+    parser.add_argument("--output", default=None, help="INT8 model (default: <model>.int8.onnx)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("dynamic", help="weight-only ahead-of-time quantization")
+    static = commands.add_parser("static", help="calibrated weight and activation quantization")
+    static.add_argument("--images", default=root, help="directory of calibration images")
+    static.add_argument("--no-per-channel", dest="per_channel", action="store_false")
+    compare = commands.add_parser("compare", help="latency / throughput / size / agreement report")
+    compare.add_argument("--images", default=root, help="directory of evaluation images")
+    compare.add_argument("--batch-size", type=int, default=8)
+    compare.add_argument("--repeat", type=int, default=20)
+    compare.add_argument("--report", default=None, help="also write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    output = args.output or int8_model_path(args.model)
+    if args.command == "dynamic":
+        quantize_dynamic_model(args.model, output)
+        print(f"Wrote {output}")
+    elif args.command == "static":
+        quantize_static_model(args.model, output, args.images, args.per_channel)
+        print(f"Wrote {output}")
+    else:
+        report = compare_models(args.model, output, args.images, args.batch_size, args.repeat)
+        print(json.dumps(report, indent=2))
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
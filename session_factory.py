@@ -0,0 +1,220 @@
+import hashlib
+import logging
+import os
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# onnxruntime is imported inside the functions that need it, so the path helpers
+# below stay cheap to import for the API process.
+_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+_EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+
+# Extra graph output carrying the classifier's input features (see with_dynamic_batch).
+EMBEDDING_OUTPUT = "embedding"
+# Ops that apply the classifier's weights, in FP32 and in quantized graphs.
+_CLASSIFIER_OPS = {"Gemm", "MatMul", "MatMulInteger", "QLinearMatMul", "QGemm"}
+# Quantization plumbing between the classifier and the float features it reads.
+_QUANTIZE_OPS = {"QuantizeLinear", "DequantizeLinear", "DynamicQuantizeLinear"}
+
+
+MODEL_INPUTS = ("float32", "uint8")
+
+
+def with_dynamic_batch(model_path: str, embedding_output: bool = False, uint8_input: bool = False) -> bytes:
+    """Return the serialized model with a symbolic batch axis (unchanged bytes if onnx isn't installed).
+
+    The bundled export pins the batch dimension to 1; relaxing it lets one
+    session.run serve a whole micro-batch instead of one image at a time.
+    With ``embedding_output`` the input of the final classifier layer (the
+    flattened penultimate features) is also exposed as EMBEDDING_OUTPUT.
+    With ``uint8_input`` the model takes (N,H,W,3) uint8 pixels and does the
+    layout change and /255 scaling itself (see _fold_input_scaling).
+    """
+    try:
+        import onnx
+    except ImportError:
+        if uint8_input:
+            raise RuntimeError("uint8 model input needs the onnx package") from None
+        with open(model_path, "rb") as f:
+            return f.read()
+    model = onnx.load(model_path)
+    if embedding_output:
+        _add_embedding_output(model)
+    if uint8_input:
+        _fold_input_scaling(model)
+    for value in list(model.graph.input) + list(model.graph.output):
+        value.type.tensor_type.shape.dim[0].dim_param = "batch"
+    return model.SerializeToString()
+
+
+def _fold_input_scaling(model):
+    # uint8 (N,H,W,C) -> Transpose -> Cast -> Div 255 -> the original (N,C,H,W) float input.
+    # Transposing before the cast moves bytes rather than floats, and Div by 255
+    # rounds exactly like preprocess_image's np.divide, so scores don't change.
+    import onnx
+
+    graph_input = model.graph.input[0]
+    name = graph_input.name
+    # A "pixels" prefix keeps clear of names quantize.py gives the input's own Q/DQ tensors (e.g. input_scale).
+    nchw, floats, scale, scaled = (f"{name}_pixels_{step}" for step in ("nchw", "float", "scale", "scaled"))
+    for node in model.graph.node:
+        node.input[:] = [scaled if value == name else value for value in node.input]
+    channels, height, width = (dim.dim_value for dim in graph_input.type.tensor_type.shape.dim[1:])
+    model.graph.initializer.append(onnx.numpy_helper.from_array(np.array(255.0, dtype=np.float32), scale))
+    model.graph.node.insert(0, onnx.helper.make_node("Div", [floats, scale], [scaled]))
+    model.graph.node.insert(0, onnx.helper.make_node("Cast", [nchw], [floats], to=onnx.TensorProto.FLOAT))
+    model.graph.node.insert(0, onnx.helper.make_node("Transpose", [name], [nchw], perm=[0, 3, 1, 2]))
+    graph_input.CopyFrom(onnx.helper.make_tensor_value_info(
+        name, onnx.TensorProto.UINT8, ["batch", height, width, channels]))
+
+
+def _add_embedding_output(model):
+    # Walk back from the logits past bias adds, rescaling and Q/DQ pairs to the
+    # classifier's weight op, then past its input quantization to the float features.
+    import onnx
+
+    producers = {output: node for node in model.graph.node for output in node.output}
+    classifier = producers.get(model.graph.output[0].name)
+    while classifier is not None and classifier.op_type not in _CLASSIFIER_OPS:
+        classifier = producers.get(classifier.input[0])
+    if classifier is None:
+        logger.warning("No classifier layer found; serving the model without an embedding output")
+        return
+    features = classifier.input[0]
+    while features in producers and producers[features].op_type in _QUANTIZE_OPS:
+        features = producers[features].input[0]
+
+    inferred = onnx.shape_inference.infer_shapes(model)
+    tensor_type = next(value.type.tensor_type for value in inferred.graph.value_info if value.name == features)
+    if tensor_type.elem_type != onnx.TensorProto.FLOAT:
+        logger.warning("Classifier features %s are not float32; serving the model without an embedding output",
+                       features)
+        return
+    width = tensor_type.shape.dim[-1].dim_value or None
+    model.graph.node.append(onnx.helper.make_node("Identity", [features], [EMBEDDING_OUTPUT], name="embedding_output"))
+    model.graph.output.append(
+        onnx.helper.make_tensor_value_info(EMBEDDING_OUTPUT, onnx.TensorProto.FLOAT, ["batch", width]))
+
+
+def int8_model_path(model_path: str) -> str:
+    """Default location of the quantized variant written by quantize.py: <name>.int8.onnx."""
+    stem, ext = os.path.splitext(model_path)
+    return f"{stem}.int8{ext}"
+
+
+def resolve_model_path(settings) -> str:
+    """Model file to serve for the configured precision."""
+    if settings.model_precision == "fp32":
+        return settings.model_path
+    if settings.model_precision == "int8":
+        path = settings.int8_model_path or int8_model_path(settings.model_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"INT8 model {path} not found; create it with `python quantize.py static`")
+        return path
+    raise ValueError(f"Unsupported model precision: {settings.model_precision!r} (expected 'fp32' or 'int8')")
+
+
+def build_session_options(settings, intra_op_threads: int) -> "ort.SessionOptions":
+    import onnxruntime as ort
+
+    try:
+        level = getattr(ort.GraphOptimizationLevel, _OPTIMIZATION_LEVELS[settings.ort_graph_optimization])
+        mode = getattr(ort.ExecutionMode, _EXECUTION_MODES[settings.ort_execution_mode])
+    except KeyError as e:
+        raise ValueError(f"Unsupported ONNX Runtime setting: {e.args[0]!r}") from None
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = settings.ort_inter_op_threads
+    options.execution_mode = mode
+    options.graph_optimization_level = level
+    options.enable_cpu_mem_arena = settings.ort_enable_mem_arena
+    options.enable_mem_pattern = settings.ort_enable_mem_pattern
+    return options
+
+
+def optimized_model_path(settings, model_path: str, model_bytes: bytes) -> str:
+    """Cache file for the optimized graph, keyed on everything that shapes it.
+
+    Level "all" may apply hardware-specific layouts, so the ORT version is part
+    of the key and the cache directory should not be shared between CPU types.
+    """
+    import onnxruntime as ort
+
+    digest = hashlib.sha256(model_bytes).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    name = f"{stem}.{digest}.ort-{ort.__version__}.{settings.ort_graph_optimization}.onnx"
+    return os.path.join(settings.optimized_model_dir, name)
+
+
+def create_session(settings, intra_op_threads: int) -> "ort.InferenceSession":
+    """Build the InferenceSession, reusing a previously saved optimized graph when one exists."""
+    import onnxruntime as ort
+
+    started = time.perf_counter()
+    model_path = resolve_model_path(settings)
+    if settings.model_input not in MODEL_INPUTS:
+        raise ValueError(f"Unsupported model input: {settings.model_input!r} (expected 'float32' or 'uint8')")
+    model_bytes = with_dynamic_batch(
+        model_path, embedding_output=settings.embedding_output, uint8_input=settings.model_input == "uint8")
+    options = build_session_options(settings, intra_op_threads)
+    providers = ["CPUExecutionProvider"]
+
+    if not settings.optimized_model_dir or settings.ort_graph_optimization == "disable":
+        session = ort.InferenceSession(model_bytes, options, providers=providers)
+        logger.info("Loaded %s in %.1f ms", model_path, 1000 * (time.perf_counter() - started))
+        return session
+
+    cached_path = optimized_model_path(settings, model_path, model_bytes)
+    if os.path.exists(cached_path):
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            session = ort.InferenceSession(cached_path, options, providers=providers)
+            logger.info("Loaded optimized graph %s in %.1f ms", cached_path, 1000 * (time.perf_counter() - started))
+            return session
+        except Exception:
+            logger.warning("Ignoring unreadable optimized graph %s", cached_path, exc_info=True)
+            options = build_session_options(settings, intra_op_threads)
+
+    # Write under a per-process name and rename, so concurrently starting
+    # workers never read a half-written file.
+    os.makedirs(settings.optimized_model_dir, exist_ok=True)
+    partial_path = f"{cached_path}.{os.getpid()}.tmp"
+    options.optimized_model_filepath = partial_path
+    session = ort.InferenceSession(model_bytes, options, providers=providers)
+    try:
+        os.replace(partial_path, cached_path)
+    except OSError:
+        logger.warning("Could not save optimized graph to %s", cached_path, exc_info=True)
+    logger.info("Optimized %s in %.1f ms, saved to %s", model_path, 1000 * (time.perf_counter() - started), cached_path)
+    return session
+
+
+def batch_limit(session) -> Optional[int]:
+    """Fixed batch size of the session's input, or None when the batch axis is dynamic."""
+    batch_dim = session.get_inputs()[0].shape[0]
+    return batch_dim if isinstance(batch_dim, int) else None
+
+
+def run_in_chunks(run: Callable[[np.ndarray], np.ndarray], batch: np.ndarray, limit: Optional[int]) -> np.ndarray:
+    """``run(batch)``, fed in chunks of at most ``limit`` rows when the graph pins its batch axis.
+
+    with_dynamic_batch can only relax the axis when onnx is installed; without
+    it the bundled export still takes one image per run.
+    """
+    if limit is None or batch.shape[0] <= limit:
+        return run(batch)
+    return np.concatenate([run(batch[start:start + limit]) for start in range(0, batch.shape[0], limit)])
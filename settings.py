@@ -0,0 +1,171 @@
+import json
+import os
+import tomllib
+from dataclasses import dataclass, fields
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+
+# ----------------------------------------------------
+# Settings
+# ----------------------------------------------------
+@dataclass(frozen=True)
+class Settings:
+    """Tunable knobs for the breed API.
+
+    Every field can be set in the config file named by CATTLE_CONFIG (TOML or
+    JSON, keys are the field names) and overridden by a CATTLE_<FIELD> variable.
+    """
+    # Micro-batching: flush a batch once it holds this many images...
+    batch_max_size: int = 8
+    # ...or once the oldest queued image has waited this long.
+    batch_max_wait_ms: float = 5.0
+    # Decode/preprocess pool: "thread" or "process"; 0 workers means size from the core count.
+    decode_executor: str = "thread"
+    decode_workers: int = 0
+    # Concurrent session.run calls, and ORT intra-op threads for each (0 = auto).
+    inference_workers: int = 1
+    ort_intra_op_threads: int = 0
+    # Jobs allowed to wait per pool before requests are turned away with a 503.
+    executor_max_queue: int = 64
+    # Admission control for analyze requests: how many are analyzed at once (0 = two
+    # full batches per inference slot), how many may wait for a turn, and the default
+    # deadline (ms) for requests without an X-Deadline-Ms header. Requests that would
+    # wait past their deadline are refused with a 503 + Retry-After.
+    admission_max_concurrency: int = 0
+    admission_max_queue: int = 64
+    latency_budget_ms: float = 2000.0
+    # Bulk endpoint: images in flight per request, and the largest image accepted.
+    bulk_window: int = 16
+    max_image_bytes: int = 20 * 1024 * 1024
+    # Upload guards checked before decoding: whole bulk request body, pixel count
+    # read from the image header, and the Pillow formats accepted.
+    max_bulk_bytes: int = 2 * 1024 * 1024 * 1024
+    max_image_pixels: int = 50_000_000
+    allowed_image_formats: str = "JPEG,MPO,PNG,WEBP,BMP"
+    # Longest temporal-smoothing window (frames) a live stream may ask for.
+    stream_max_window: int = 30
+    # Most test-time-augmentation views one request may ask for.
+    tta_max_views: int = 8
+    # Herd tiling: long side of the working resolution the 224x224 tiles are cut
+    # from, the fraction by which neighbouring tiles overlap, and the most tiles
+    # one photo may be cut into before it is refused with a 413 (0 = no limit).
+    tile_max_side: int = 1120
+    tile_overlap: float = 0.25
+    tile_max_count: int = 64
+    # Expose the penultimate-layer embedding as a second model output (needs the onnx
+    # package), and where embeddings of analyzed uploads are indexed. Indexing keeps
+    # every upload's file name and prediction on disk, so it is opt-in ("" disables).
+    embedding_output: bool = True
+    similarity_index_dir: str = ""
+    # Prediction cache: memory bound (0 disables), entry lifetime, and the
+    # optional near-duplicate tier with its Hamming-distance threshold.
+    cache_max_bytes: int = 8 * 1024 * 1024
+    cache_ttl_seconds: float = 3600.0
+    cache_perceptual: bool = False
+    cache_max_hamming: int = 6
+    # Add a Server-Timing header with the per-stage breakdown to analyze responses.
+    server_timing: bool = False
+    # Cache-Control max-age for the breed catalogue endpoints.
+    catalogue_max_age: int = 3600
+    # ONNX Runtime session (0 threads = ORT default).
+    model_path: str = os.path.join(_HERE, "bovine_model.onnx")
+    # "fp32" serves model_path; "int8" serves the quantized variant (default <model>.int8.onnx).
+    model_precision: str = "fp32"
+    int8_model_path: str = ""
+    # "float32" feeds the model normalized (N,3,224,224) tensors; "uint8" feeds raw (N,224,224,3)
+    # pixels and folds the layout change and /255 scaling into the graph (needs the onnx package).
+    model_input: str = "float32"
+    # Class-index -> breed table (default <model>.labels.json) and the softmax
+    # temperature used to calibrate reported confidences.
+    labels_path: str = ""
+    score_temperature: float = 1.0
+    # Hot model reload (local backend): poll the model file every this many seconds and
+    # swap in a changed model once it is loaded and warmed (0 disables watching); the
+    # fraction of batches a reloaded model shadows before an admin promotes it (0 swaps
+    # it in at once); and the X-Admin-Token the /admin endpoints require ("" disables them).
+    model_watch_interval_s: float = 0.0
+    model_shadow_fraction: float = 0.0
+    admin_token: str = ""
+    ort_inter_op_threads: int = 0
+    ort_execution_mode: str = "sequential"  # or "parallel"
+    ort_graph_optimization: str = "all"  # "disable", "basic", "extended" or "all"
+    ort_enable_mem_arena: bool = True
+    ort_enable_mem_pattern: bool = True
+    # "local" runs the session in this process; "shm" ships batches to inference_server.py
+    # over shared memory, through shm_slots ring slots per HTTP worker.
+    inference_backend: str = "local"
+    shm_socket_path: str = "/tmp/cattle-inference.sock"
+    shm_slots: int = 2
+    # Inference processes started by inference_server.py (0 = half the cores).
+    inference_processes: int = 0
+    # Where the optimized graph is saved on first load and reused afterwards ("" disables).
+    optimized_model_dir: str = os.path.join(_HERE, ".ort_cache")
+
+
+# Lower bounds applied to numeric settings after loading.
+_MINIMUMS = {
+    "batch_max_size": 1,
+    "batch_max_wait_ms": 0.0,
+    "decode_workers": 0,
+    "inference_workers": 1,
+    "ort_intra_op_threads": 0,
+    "ort_inter_op_threads": 0,
+    "executor_max_queue": 0,
+    "admission_max_concurrency": 0,
+    "admission_max_queue": 0,
+    "latency_budget_ms": 1.0,
+    "bulk_window": 1,
+    "max_image_bytes": 1,
+    "max_bulk_bytes": 1,
+    "max_image_pixels": 1,
+    "stream_max_window": 1,
+    "tta_max_views": 1,
+    "tile_max_side": 224,
+    "tile_overlap": 0.0,
+    "tile_max_count": 0,
+    "cache_max_bytes": 0,
+    "cache_ttl_seconds": 0.0,
+    "cache_max_hamming": 0,
+    "catalogue_max_age": 0,
+    "score_temperature": 0.01,
+    "model_watch_interval_s": 0.0,
+    "model_shadow_fraction": 0.0,
+    "shm_slots": 1,
+    "inference_processes": 0,
+}
+
+
+def _parse(value: str, kind):
+    if kind is bool:
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return kind(value)
+
+
+def _read_config_file(path: str) -> dict:
+    with open(path, "rb") as f:
+        if path.endswith(".json"):
+            return json.load(f)
+        return tomllib.load(f)
+
+
+def load_settings(config_path: str = None) -> Settings:
+    """Build Settings from the config file (if any), then CATTLE_* environment overrides."""
+    known = {field.name: field.type for field in fields(Settings)}
+    values = {}
+
+    config_path = config_path or os.environ.get("CATTLE_CONFIG")
+    if config_path:
+        values.update(_read_config_file(config_path))
+        unknown = set(values) - set(known)
+        if unknown:
+            raise ValueError(f"Unknown settings in {config_path}: {', '.join(sorted(unknown))}")
+
+    for name, kind in known.items():
+        raw = os.environ.get(f"CATTLE_{name.upper()}")
+        if raw not in (None, ""):
+            values[name] = _parse(raw, kind)
+
+    for name, minimum in _MINIMUMS.items():
+        if name in values:
+            values[name] = max(minimum, values[name])
+    return Settings(**values)
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so ownership isn't enforced.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Rows scanned per matrix multiply; bounds the temporary score matrix, not the index size.
+SEARCH_CHUNK_ROWS = 65536
+
+
+class IndexBusy(RuntimeError):
+    """Raised when another process already owns the index directory."""
+
+
+# ----------------------------------------------------
+# On-Disk Similarity Index
+# ----------------------------------------------------
+class SimilarityIndex:
+    """Append-only store of L2-normalized embeddings with exact cosine nearest-neighbour search.
+
+    ``vectors.f32`` holds the raw (N, dim) float32 matrix and is memory-mapped
+    for searches, so the OS page cache rather than the heap holds it.
+    ``meta.jsonl`` holds one JSON line per row (file name, breed, confidence,
+    time, content digest); only the byte offsets of its lines and an 8-byte
+    digest per row (to skip re-indexing the same upload) stay in memory.
+    Search is one matrix multiply per chunk of rows for all queries at once.
+    """
+
+    def __init__(self, directory: str, dim: int):
+        self.dim = dim
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = self._claim(directory)
+        self._vectors_path = os.path.join(directory, "vectors.f32")
+        self._meta_path = os.path.join(directory, "meta.jsonl")
+        self._lock = threading.Lock()
+        self._offsets: List[int] = []
+        self._meta_bytes = 0
+        self._digests = set()
+        self._closed = False
+        self._load()
+        self._vectors = open(self._vectors_path, "ab")
+        self._meta = open(self._meta_path, "ab")
+
+    def __len__(self):
+        return len(self._offsets)
+
+    @staticmethod
+    def _claim(directory: str):
+        # Offsets and digests live in memory, so two writers would corrupt each other's view.
+        lock_file = open(os.path.join(directory, "lock"), "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                raise IndexBusy(f"{directory} is in use by another process")
+        return lock_file
+
+    @staticmethod
+    def digest(contents: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(contents, digest_size=8).digest(), "little")
+
+    def _load(self):
+        # Rebuild line offsets and digests; a crash between the two appends leaves
+        # one file a row ahead, so both are cut back to the rows present in each.
+        row_bytes = self.dim * 4
+        vector_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        offset = 0
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "rb") as f:
+                for line in f:
+                    if len(self._offsets) == vector_rows or not line.endswith(b"\n"):
+                        break
+                    self._offsets.append(offset)
+                    self._digests.add(json.loads(line)["digest"])
+                    offset += len(line)
+            os.truncate(self._meta_path, offset)
+        self._meta_bytes = offset
+        if os.path.exists(self._vectors_path):
+            os.truncate(self._vectors_path, len(self._offsets) * row_bytes)
+
+    def add(self, embedding: np.ndarray, contents: bytes, metadata: dict) -> bool:
+        """Index one upload's embedding; returns False if the same bytes were indexed before."""
+        digest = self.digest(contents)
+        if digest in self._digests:
+            return False
+        vector = np.asarray(embedding, dtype=np.float32).reshape(self.dim)
+        vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+        line = json.dumps({**metadata, "indexed_at": round(time.time(), 3), "digest": digest}).encode() + b"\n"
+        with self._lock:
+            if self._closed:  # retired by a model swap while this request was in flight
+                return False
+            self._vectors.write(vector.astype(np.float32).tobytes())
+            self._vectors.flush()
+            self._meta.write(line)
+            self._meta.flush()
+            self._offsets.append(self._meta_bytes)
+            self._meta_bytes += len(line)
+            self._digests.add(digest)
+        return True
+
+    def search(self, queries: np.ndarray, k: int) -> List[List[dict]]:
+        """The k most similar indexed rows for each (Q, dim) query, best first, with their metadata."""
+        with self._lock:
+            count = len(self._offsets)
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        k = min(k, count)
+        if k <= 0:
+            return [[] for _ in queries]
+
+        vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim))
+        best_rows = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+        for start in range(0, count, SEARCH_CHUNK_ROWS):
+            scores = queries @ vectors[start:start + SEARCH_CHUNK_ROWS].T  # (Q, chunk)
+            take = min(k, scores.shape[1])
+            rows = np.argpartition(scores, -take, axis=1)[:, -take:]
+            # Merge this chunk's winners with the running top-k.
+            best_scores = np.concatenate([best_scores, np.take_along_axis(scores, rows, axis=1)], axis=1)
+            best_rows = np.concatenate([best_rows, rows + start], axis=1)
+            if best_scores.shape[1] > k:
+                keep = np.argpartition(best_scores, -k, axis=1)[:, -k:]
+                best_scores = np.take_along_axis(best_scores, keep, axis=1)
+                best_rows = np.take_along_axis(best_rows, keep, axis=1)
+        del vectors
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        best_rows = np.take_along_axis(best_rows, order, axis=1)
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        return [
+            [{"id": int(row), "similarity": round(float(score), 4), **self._metadata(int(row))}
+             for row, score in zip(rows, scores)]
+            for rows, scores in zip(best_rows, best_scores)
+        ]
+
+    def _metadata(self, row: int) -> dict:
+        with open(self._meta_path, "rb") as f:
+            f.seek(self._offsets[row])
+            metadata = json.loads(f.readline())
+        metadata.pop("digest", None)
+        return metadata
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._vectors.close()
+            self._meta.close()
+            self._lock_file.close()
+
+
+def open_index(directory: str, model_path: str, dim: int, version: str = "") -> Optional[SimilarityIndex]:
+    """The index under ``directory`` for this model's ``dim``-wide embeddings, or None when disabled.
+
+    Each model file and ``version`` (content digest) gets its own subdirectory,
+    since embeddings from different models (or precisions, or retrainings)
+    aren't comparable. Only one process may own an index; in the others (e.g.
+    extra uvicorn workers) search is disabled.
+    """
+    if not directory or not dim:
+        return None
+    stem = os.path.splitext(os.path.basename(model_path))[0]
+    name = f"{stem}-{dim}-{version}" if version else f"{stem}-{dim}"
+    try:
+        return SimilarityIndex(os.path.join(directory, name), dim)
+    except IndexBusy as e:
+        logger.warning("Similarity search disabled in this process: %s", e)
+        return None
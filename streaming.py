@@ -0,0 +1,67 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+# ----------------------------------------------------
+# Latest-Frame Mailbox
+# ----------------------------------------------------
+class FrameSlot:
+    """Single-slot mailbox between a stream's receiver and its classifier.
+
+    A new frame replaces one that hasn't been picked up yet, so a client
+    sending faster than inference keeps at most one frame waiting and always
+    gets its most recent frame classified next.
+    """
+
+    def __init__(self):
+        self._frame: Optional[Tuple[int, bytes, float]] = None
+        self._ready = asyncio.Event()
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+
+    def put(self, contents: bytes) -> int:
+        """Offer a frame and return its sequence number (1-based, in arrival order)."""
+        self.received += 1
+        if self._frame is not None:
+            self.dropped += 1
+        self._frame = (self.received, contents, time.perf_counter())
+        self._ready.set()
+        return self.received
+
+    def close(self):
+        self.closed = True
+        self._ready.set()
+
+    async def get(self) -> Optional[Tuple[int, bytes, float]]:
+        """Wait for the newest frame as (sequence, contents, received_at); None once closed."""
+        while self._frame is None:
+            if self.closed:
+                return None
+            await self._ready.wait()
+            self._ready.clear()
+        if self.closed:
+            return None
+        frame, self._frame = self._frame, None
+        return frame
+
+
+# ----------------------------------------------------
+# Temporal Smoothing
+# ----------------------------------------------------
+class PredictionSmoother:
+    """Mean class probabilities over the last ``window`` classified frames."""
+
+    def __init__(self, window: int):
+        self._scores = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self._scores)
+
+    def add(self, scores: np.ndarray) -> np.ndarray:
+        self._scores.append(scores)
+        return np.mean(self._scores, axis=0)
@@ -0,0 +1,204 @@
+import asyncio
+from collections import deque
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Dict
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+
+from preprocessing import ImageRejected
+
+READ_CHUNK_BYTES = 64 * 1024
+
+
+class UploadTooLarge(HTTPException):
+    """Raised while the request body is still streaming in; FastAPI re-raises it from form parsing."""
+
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Request body exceeds {limit} bytes")
+
+
+# ----------------------------------------------------
+# ASGI Middleware
+# ----------------------------------------------------
+class BodySizeLimitMiddleware:
+    """Refuse request bodies over a per-path byte limit before they are parsed or spooled.
+
+    A Content-Length over the limit is answered with 413 without reading the
+    body at all; chunked or understated bodies are cut off as soon as the
+    running byte count crosses the limit.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"error": f"Request body exceeds {limit} bytes"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise UploadTooLarge(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# ----------------------------------------------------
+# Bounded Upload Reads
+# ----------------------------------------------------
+async def read_upload(upload: UploadFile, limit: int) -> bytes:
+    """Read an uploaded file in chunks, giving up with a 413 as soon as it passes ``limit`` bytes."""
+    if upload.size is not None and upload.size > limit:
+        raise ImageRejected(413, f"Image exceeds {limit} bytes")
+    chunks = []
+    total = 0
+    while chunk := await upload.read(READ_CHUNK_BYTES):
+        total += len(chunk)
+        if total > limit:
+            raise ImageRejected(413, f"Image exceeds {limit} bytes")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+# ----------------------------------------------------
+# Incremental Multipart Parsing
+# ----------------------------------------------------
+class MultipartStream:
+    """Parse a multipart/form-data body part by part as it arrives, instead of spooling the whole form first.
+
+    ``parts()`` yields ``(field, filename, payload)`` once each part is complete
+    and only reads more of the body when asked for the next part, so a slow
+    consumer holds the upload back. Parts of ``spool_fields`` are written to a
+    temporary file (spilling to disk past 1 MB) and yielded as that file; any
+    other part is kept in memory up to ``part_limit`` bytes, and beyond that is
+    dropped and yielded as an ImageRejected(413).
+    """
+
+    spool_max_size = 1024 * 1024
+
+    def __init__(self, stream: AsyncIterator[bytes], content_type: str, part_limit: int, spool_fields=()):
+        _, params = parse_options_header(content_type)
+        if b"boundary" not in params:
+            raise ImageRejected(400, "Expected a multipart/form-data body")
+        self.stream = stream
+        self.part_limit = part_limit
+        self.spool_fields = frozenset(spool_fields)
+        self._parser = MultipartParser(params[b"boundary"], {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+        self._ready = deque()
+        self._spool_writes = []
+        self.finished = asyncio.Event()
+
+    def _on_part_begin(self):
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._field = self._filename = None
+        self._data = bytearray()
+        self._file = None
+        self._oversized = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        self._field = options.get(b"name", b"").decode("utf-8", "replace")
+        if b"filename" in options:
+            self._filename = options[b"filename"].decode("utf-8", "replace")
+        if self._field in self.spool_fields:
+            self._file = SpooledTemporaryFile(max_size=self.spool_max_size)
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._file is not None:
+            self._spool_writes.append((self._file, data[start:end]))
+        elif not self._oversized:
+            self._data += data[start:end]
+            if len(self._data) > self.part_limit:
+                self._oversized = True
+                self._data = bytearray()
+
+    def _on_part_end(self):
+        if self._file is not None:
+            payload = self._file
+        elif self._oversized:
+            payload = ImageRejected(413, f"Image exceeds {self.part_limit} bytes")
+        else:
+            payload = bytes(self._data)
+        self._ready.append((self._field, self._filename, payload))
+
+    async def parts(self):
+        try:
+            async for chunk in self.stream:
+                try:
+                    self._parser.write(chunk)
+                except MultipartParseError as e:
+                    raise ImageRejected(400, f"Malformed multipart body: {e}") from None
+                if self._spool_writes:
+                    # Large parts spill to disk, so keep their writes off the event loop.
+                    writes, self._spool_writes = self._spool_writes, []
+                    await asyncio.to_thread(_write_all, writes)
+                while self._ready:
+                    field, filename, payload = self._ready.popleft()
+                    if not isinstance(payload, (bytes, ImageRejected)):
+                        payload.seek(0)
+                    yield field, filename, payload
+        finally:
+            self.finished.set()
+
+
+def _write_all(writes):
+    for file, data in writes:
+        file.write(data)
+
+
+class UploadStreamingResponse(StreamingResponse):
+    """A StreamingResponse whose body iterator is still reading the request body.
+
+    On ASGI servers older than spec 2.4 Starlette listens for the client
+    disconnecting by calling ``receive`` alongside the stream, which would
+    swallow the body chunks the iterator is waiting for; the listener only
+    starts once ``body_read`` is set.
+    """
+
+    def __init__(self, content, body_read: asyncio.Event, **kwargs):
+        super().__init__(content, **kwargs)
+        self.body_read = body_read
+
+    async def listen_for_disconnect(self, receive):
+        await self.body_read.wait()
+        await super().listen_for_disconnect(receive)